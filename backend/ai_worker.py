@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+AI job worker for Dracarys
+Runs /ai/jobs workers without the API, so they scale separately from it
+(set AI_JOB_WORKERS=0 on the API to leave all jobs to these processes).
+SIGTERM stops claiming jobs and gives running ones AI_JOB_SHUTDOWN_GRACE
+seconds before they are requeued.
+
+  python ai_worker.py --concurrency 20
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from app.ai_gateway import agent_gateway
+from app.ai_history import interaction_log
+from app.ai_jobs import ai_jobs
+from app.config import settings
+from app.database import get_async_engine
+
+async def run(concurrency: int) -> None:
+    get_async_engine()
+    agent_gateway.start()
+    await interaction_log.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    ai_jobs.start(concurrency)
+    print(f"🤖 Running AI jobs, {concurrency} at a time")
+    await stop.wait()
+
+    print("🛑 Stopping; waiting for running jobs")
+    await ai_jobs.stop(settings.ai_job_shutdown_grace)
+    await interaction_log.close()
+    await agent_gateway.close()
+    await get_async_engine().dispose()
+    print(f"✅ Stopped: {ai_jobs.stats()}")
+
+def main():
+    """Main AI worker function"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=max(1, settings.ai_job_workers),
+                        help="jobs run at once (default AI_JOB_WORKERS)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run(args.concurrency))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from .config import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+
+def normalize_prompt(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _WHITESPACE.sub(" ", text).strip().rstrip("?!. ")
+
+
+def embed(text: str, dims: int) -> "np.ndarray":
+    """Hashed bag of words and character trigrams, L2-normalized.
+
+    Cheap, deterministic across processes and good enough to catch
+    rephrasings that share most of their words.
+    """
+    import numpy as np
+
+    vector = np.zeros(dims, dtype=np.float32)
+    words = _WORD.findall(text)
+    features = words + [text[i:i + 3] for i in range(max(len(text) - 2, 0))]
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dims
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+@dataclass
+class CachedAnswer:
+    response: str
+    scope: str
+    size: int
+    expires_at: float
+    row: int
+
+
+class AIResponseCache:
+    """LRU/TTL cache of agent responses with a byte budget.
+
+    Lookups first try the normalized prompt exactly, then (when
+    ``similarity_threshold`` > 0) the nearest cached prompt by cosine
+    similarity over hashed embeddings held in one NumPy matrix, which
+    (like NumPy itself) is only set up by the first ``store``. Each row
+    also records its scope, and rows of other scopes are masked out before
+    ranking, so a scope's own entries can't be crowded out by others'.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: int, similarity_threshold: float, dims: int):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.dims = dims
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._vectors: Optional["np.ndarray"] = None
+        self._row_scopes: Optional["np.ndarray"] = None
+        self._row_keys: List[Optional[str]] = []
+        self._free_rows: List[int] = []
+        self._scope_ids: Dict[str, int] = {}
+
+    @staticmethod
+    def _key(scope: str, normalized: str) -> str:
+        return f"{scope}\x00{normalized}"
+
+    def lookup(self, text: str, scope: str = "") -> Optional[Tuple[str, str]]:
+        """Return ``(response, "exact" | "similar")`` or None."""
+        normalized = normalize_prompt(text)
+        now = time.monotonic()
+
+        entry = self._live(self._key(scope, normalized), now)
+        if entry is not None:
+            self.exact_hits += 1
+            return entry.response, "exact"
+
+        scope_id = self._scope_ids.get(scope)
+        if self.similarity_threshold > 0 and scope_id is not None:
+            import numpy as np
+
+            scores = np.where(self._row_scopes == scope_id, self._vectors @ embed(normalized, self.dims), -np.inf)
+            # A few candidates in case the best ones have expired
+            for row in np.argsort(scores)[::-1][:5]:
+                if scores[row] < self.similarity_threshold:
+                    break
+                entry = self._live(self._row_keys[row], now)
+                if entry is not None:
+                    self.similar_hits += 1
+                    return entry.response, "similar"
+
+        self.misses += 1
+        return None
+
+    def store(self, text: str, response: str, scope: str = "") -> None:
+        normalized = normalize_prompt(text)
+        key = self._key(scope, normalized)
+        size = len(key.encode()) + len(response.encode()) + self.dims * 4
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+
+        row = self._allocate_row()
+        self._vectors[row] = embed(normalized, self.dims)
+        self._row_scopes[row] = self._scope_ids.setdefault(scope, len(self._scope_ids))
+        self._row_keys[row] = key
+        self._entries[key] = CachedAnswer(
+            response=response,
+            scope=scope,
+            size=size,
+            expires_at=time.monotonic() + self.ttl_seconds,
+            row=row,
+        )
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _live(self, key: str, now: float) -> Optional[CachedAnswer]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _allocate_row(self) -> int:
+        if not self._free_rows:
+            import numpy as np
+
+            capacity = len(self._row_keys)
+            added = max(capacity, 64)
+            grown = np.zeros((capacity + added, self.dims), dtype=np.float32)
+            scopes = np.full(capacity + added, -1, dtype=np.int32)
+            if self._vectors is not None:
+                grown[:capacity] = self._vectors
+                scopes[:capacity] = self._row_scopes
+            self._vectors = grown
+            self._row_scopes = scopes
+            self._row_keys.extend([None] * added)
+            self._free_rows = list(range(capacity + added - 1, capacity - 1, -1))
+        return self._free_rows.pop()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._vectors[entry.row] = 0.0
+        self._row_scopes[entry.row] = -1
+        self._row_keys[entry.row] = None
+        self._free_rows.append(entry.row)
+        self.bytes -= entry.size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.similar_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.exact_hits + self.similar_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+ai_response_cache = AIResponseCache(
+    max_bytes=settings.ai_cache_max_bytes,
+    ttl_seconds=settings.ai_cache_ttl_seconds,
+    similarity_threshold=settings.ai_cache_similarity_threshold,
+    dims=settings.ai_cache_embedding_dims,
+)
@@ -0,0 +1,221 @@
+"""Gateway between /ai/process and the external AI agent.
+
+The agent is called with ``POST {ai_agent_url}`` and a JSON body of
+``{"input": str, "user_id": int, "stream": bool}``. Non-streaming calls
+expect ``{"response": str}`` back; streaming calls expect newline-delimited
+JSON objects of the form ``{"token": str}``.
+"""
+
+import asyncio
+import json
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException, Request, status
+
+from .config import settings
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class AgentGateway:
+    def __init__(
+        self,
+        url: Optional[str],
+        timeout: float,
+        connect_timeout: float,
+        max_connections: int,
+        max_concurrency: int,
+        max_concurrency_per_user: int,
+        queue_timeout: float,
+    ):
+        self.url = url
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_user = max_concurrency_per_user
+        self.queue_timeout = queue_timeout
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[int, int] = {}
+
+    def start(self) -> "httpx.AsyncClient":
+        # httpx is imported here, in the lifespan, rather than with the app
+        import httpx
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def acquire(self, user_id: int) -> "AgentSlot":
+        """Reserve one per-user and one global agent call, or fail fast."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        if self._in_flight.get(user_id, 0) >= self.max_concurrency_per_user:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many AI requests in progress for this user",
+            )
+
+        self._in_flight[user_id] = self._in_flight.get(user_id, 0) + 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._release_user(user_id)
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="AI service is busy, please retry shortly",
+                headers={"Retry-After": "5"},
+            )
+        except BaseException:
+            self._release_user(user_id)
+            raise
+        return AgentSlot(self, user_id)
+
+    def _release_user(self, user_id: int) -> None:
+        self._in_flight[user_id] -= 1
+        if not self._in_flight[user_id]:
+            del self._in_flight[user_id]
+
+    async def complete(self, input_text: str, user_id: int) -> str:
+        import httpx
+
+        if not self.url:
+            return f"AI processed: {input_text}"
+
+        try:
+            response = await asyncio.wait_for(
+                self.start().post(self.url, json={"input": input_text, "user_id": user_id, "stream": False}),
+                self.timeout,
+            )
+            response.raise_for_status()
+            return response.json()["response"]
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            self.timeouts += 1
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="AI agent timed out")
+        except (httpx.HTTPError, KeyError, ValueError):
+            self.errors += 1
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="AI agent request failed")
+
+    async def stream(self, input_text: str, user_id: int) -> AsyncIterator[str]:
+        """Yield response tokens as the agent produces them.
+
+        Raises HTTPException like ``complete``; callers that have already
+        started a response must turn it into an in-band error event.
+        """
+        import httpx
+
+        if not self.url:
+            yield f"AI processed: {input_text}"
+            return
+
+        deadline = time.monotonic() + self.timeout
+        payload = {"input": input_text, "user_id": user_id, "stream": True}
+        try:
+            async with self.start().stream("POST", self.url, json=payload) as response:
+                response.raise_for_status()
+                lines = response.aiter_lines()
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    try:
+                        line = await asyncio.wait_for(lines.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        return
+                    if line.strip():
+                        yield json.loads(line)["token"]
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            self.timeouts += 1
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="AI agent timed out")
+        except (httpx.HTTPError, KeyError, ValueError):
+            self.errors += 1
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="AI agent request failed")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": sum(self._in_flight.values()),
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+
+
+class AgentSlot:
+    """A reserved agent call; ``release`` is idempotent so streaming
+    responses can release from both the generator and a background task."""
+
+    def __init__(self, gateway: AgentGateway, user_id: int):
+        self._gateway = gateway
+        self._user_id = user_id
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._gateway._semaphore.release()
+        self._gateway._release_user(self._user_id)
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect(request: Request, coro):
+    """Run ``coro`` but cancel it if the client goes away first.
+
+    Returns ``(finished, result)``; ``finished`` is False when the client
+    disconnected and the agent call was abandoned.
+    """
+    task = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except BaseException:
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if task.done():
+        return True, task.result()
+    task.cancel()
+    return False, None
+
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+agent_gateway = AgentGateway(
+    url=settings.ai_agent_url,
+    timeout=settings.ai_agent_timeout,
+    connect_timeout=settings.ai_agent_connect_timeout,
+    max_connections=settings.ai_agent_max_connections,
+    max_concurrency=settings.ai_max_concurrency,
+    max_concurrency_per_user=settings.ai_max_concurrency_per_user,
+    queue_timeout=settings.ai_queue_timeout,
+)
@@ -0,0 +1,235 @@
+"""AI interaction history, written off the request path.
+
+``interaction_log.record`` only appends to an in-process buffer; a
+background task writes the buffer as one multi-row INSERT whenever it
+reaches ``batch_size`` rows or ``flush_interval`` seconds pass, and
+``close`` drains it on shutdown. When the database rejects rows as
+invalid (a NUL byte in the text, a user deleted since) the batch is split
+until the offending rows are found, and only those are dropped and
+counted. Any other failed write, such as a lost connection, keeps the rows
+for the next flush, up to ``max_buffer`` rows; beyond that the oldest are
+dropped and counted rather than holding up requests.
+
+On PostgreSQL ``ai_interactions`` is partitioned by month. Partitions are
+created ahead of time at start-up and then every few hours (and whenever
+an insert finds no partition for its rows), and with a retention set, old
+months are dropped whole instead of deleted row by row.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import date, datetime, timezone
+from typing import Deque, Dict, Optional
+
+from sqlalchemy import insert, text
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import models
+from .config import settings
+from .database import dialect_name, get_async_engine
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = "ai_interactions_p"
+MAINTENANCE_INTERVAL = 6 * 3600
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month.year:04d}_{month.month:02d}"
+
+
+async def maintain_partitions(conn: AsyncConnection, months_ahead: int, retention_months: int) -> None:
+    """Create this month's partition and ``months_ahead`` more; drop expired ones."""
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    for offset in range(months_ahead + 1):
+        month = add_months(this_month, offset)
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF ai_interactions "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+    if retention_months <= 0:
+        return
+    oldest_kept = partition_name(add_months(this_month, -retention_months))
+    result = await conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE parent.relname = 'ai_interactions'"
+    ))
+    for name in result.scalars():
+        # Names sort by month, so a plain comparison finds the expired ones
+        if name.startswith(PARTITION_PREFIX) and name < oldest_kept:
+            await conn.execute(text(f"DROP TABLE {name}"))
+            logger.info("Dropped expired AI history partition %s", name)
+
+
+def sqlstate(exc: Exception) -> Optional[str]:
+    """SQLSTATE of a driver error (asyncpg's ``sqlstate``, psycopg2's ``pgcode``)"""
+    orig = getattr(exc, "orig", None)
+    return getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+
+
+def rejected_rows(exc: DBAPIError) -> bool:
+    """Whether the database refused the rows themselves, which another try
+    would only repeat: a data exception or an integrity violation (SQLSTATE
+    classes 22 and 23; asyncpg reports some of them as plain DBAPIErrors)."""
+    if isinstance(exc, (DataError, IntegrityError)):
+        return True
+    code = sqlstate(exc)
+    return bool(code) and code[:2] in ("22", "23")
+
+
+def missing_partition(exc: Exception) -> bool:
+    """Whether ``exc`` is PostgreSQL finding no partition for a row, which
+    is fixed by creating the partition. It is reported as a check violation
+    (SQLSTATE 23514), and ``ai_interactions`` has no CHECK constraints that
+    could raise one otherwise."""
+    return sqlstate(exc) == "23514"
+
+
+class InteractionLog:
+    def __init__(self, enabled: bool, batch_size: int, flush_interval: float, max_buffer: int):
+        self.enabled = enabled
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(1, max_buffer)
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.rejected = 0
+        self.dropped = 0
+        self._pending: Deque[Dict[str, object]] = deque(maxlen=self.max_buffer)
+        self._full: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._maintained_at = 0.0
+
+    def record(self, user_id: int, source: str, input_text: str, response: str, cache: Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+        if len(self._pending) == self.max_buffer:
+            # The append pushes out the oldest row
+            self.dropped += 1
+        self._pending.append({
+            "user_id": user_id,
+            "source": source,
+            "cache": cache,
+            "input_text": input_text,
+            "response": response,
+            "created_at": datetime.now(timezone.utc),
+        })
+        if len(self._pending) >= self.batch_size and self._full is not None:
+            self._full.set()
+
+    async def maintain(self) -> None:
+        if dialect_name() != "postgresql":
+            return
+        async with get_async_engine().begin() as conn:
+            await maintain_partitions(conn, settings.ai_history_partitions_ahead, settings.ai_history_retention_months)
+        self._maintained_at = time.monotonic()
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the rows written."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            rows = list(self._pending)
+            self._pending.clear()
+            batches = [rows[start:start + self.batch_size] for start in range(0, len(rows), self.batch_size)]
+            written = 0
+            try:
+                while batches:
+                    batch = batches[0]
+                    try:
+                        async with get_async_engine().begin() as conn:
+                            await conn.execute(insert(models.AIInteraction), batch)
+                    except DBAPIError as exc:
+                        if not rejected_rows(exc) or missing_partition(exc):
+                            raise
+                        # Halve the batch until the rejected rows are on their own
+                        batches.pop(0)
+                        if len(batch) > 1:
+                            batches[:0] = [batch[:len(batch) // 2], batch[len(batch) // 2:]]
+                        else:
+                            self.rejected += 1
+                            logger.warning("Dropped an AI history row the database rejected: %s", exc)
+                        continue
+                    batches.pop(0)
+                    written += len(batch)
+                    self.batches += 1
+            except Exception as exc:
+                self.failures += 1
+                kept = [row for batch in batches for row in batch] + list(self._pending)
+                logger.warning("Writing AI history failed, keeping %d rows for the next flush: %s",
+                               len(kept) - len(self._pending), exc)
+                self.dropped += max(0, len(kept) - self.max_buffer)
+                self._pending = deque(kept, maxlen=self.max_buffer)
+                if missing_partition(exc):
+                    # Have the flush loop create partitions before the next try
+                    self._maintained_at = 0.0
+            self.written += written
+            return written
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                if time.monotonic() - self._maintained_at > MAINTENANCE_INTERVAL:
+                    await self.maintain()
+                await self.flush()
+            except Exception as exc:
+                logger.warning("AI history maintenance failed: %s", exc)
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self._full = asyncio.Event()
+        self._closing = False
+        try:
+            await self.maintain()
+        except Exception as exc:
+            # Retried by the flush loop
+            logger.warning("Could not create AI history partitions: %s", exc)
+        self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        """Stop the flush loop and write whatever is still buffered."""
+        if self._task is not None:
+            # Let the loop finish its flush rather than cancelling it mid-write
+            self._closing = True
+            self._full.set()
+            await self._task
+            self._task = None
+        if self._pending:
+            await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buffered": len(self._pending),
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+        }
+
+
+interaction_log = InteractionLog(
+    enabled=settings.ai_history_enabled,
+    batch_size=settings.ai_history_batch_size,
+    flush_interval=settings.ai_history_flush_interval,
+    max_buffer=settings.ai_history_max_buffer,
+)
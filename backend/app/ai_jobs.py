@@ -0,0 +1,453 @@
+"""Durable queue behind /ai/jobs.
+
+Jobs are rows in ``ai_jobs``, so the API process that accepts a job and
+the worker that runs it need not be the same: every API process runs
+``ai_job_workers`` workers, and ``python ai_worker.py`` runs more on
+their own. A worker claims the due queued job with the best priority in
+one ``UPDATE ... RETURNING`` (``FOR UPDATE SKIP LOCKED`` on PostgreSQL,
+so workers never wait on each other), streams it through the agent
+gateway and writes partial output back as it goes, which is what
+``GET /ai/jobs/{id}/events`` follows.
+
+Each claim increments ``attempts``, and every later write for the claim
+matches on it, so a worker whose lease expired cannot overwrite the
+claim that replaced it.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .ai_cache import ai_response_cache
+from .ai_gateway import agent_gateway
+from .ai_history import interaction_log
+from .config import settings
+from .database import AsyncSessionLocal, get_async_engine
+from .token_cache import UserSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first; within a priority, jobs run in the order they became due
+ROLE_PRIORITY = {models.UserRole.SUPER_USER: 0, models.UserRole.CLIENT: 1}
+
+TERMINAL = (models.AIJobStatus.SUCCEEDED, models.AIJobStatus.FAILED)
+
+
+class ClaimedJob(NamedTuple):
+    id: int
+    user_id: int
+    input_text: str
+    attempts: int
+    max_attempts: int
+    cache_scope: Optional[str]
+
+
+def backoff(attempt: int, base: float, cap: float) -> float:
+    """Delay before retrying after ``attempt`` failed: doubling, capped, with jitter."""
+    return min(cap, base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+class AIJobQueue:
+    def __init__(
+        self,
+        max_attempts: int,
+        retry_backoff: float,
+        retry_backoff_max: float,
+        lease_seconds: float,
+        poll_interval: float,
+        progress_interval: float,
+        max_active_per_user: int,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+        self.max_active_per_user = max_active_per_user
+        self.submitted = 0
+        self.deduplicated = 0
+        self.cache_hits = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.deferred = 0
+        self.failed = 0
+        self.reclaimed = 0
+        self._workers: Dict[asyncio.Task, Optional[ClaimedJob]] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._progress: Dict[int, Set[asyncio.Event]] = {}
+
+    # Submitting and reading
+
+    async def submit(
+        self, db: AsyncSession, user: UserSnapshot, input_text: str, idempotency_key: Optional[str] = None
+    ) -> Tuple[models.AIJob, bool]:
+        """Queue a job for ``user``; returns ``(job, created)``.
+
+        A repeated idempotency key returns the job it first created (409 if
+        the input differs). Inputs the AI cache already answers are stored
+        as finished jobs and never queued.
+        """
+        if idempotency_key:
+            existing = await self._find_by_key(db, user.id, idempotency_key, input_text)
+            if existing is not None:
+                return existing, False
+
+        if self.max_active_per_user:
+            active = await db.scalar(
+                select(func.count(models.AIJob.id)).where(
+                    models.AIJob.user_id == user.id,
+                    models.AIJob.status.in_((models.AIJobStatus.QUEUED, models.AIJobStatus.RUNNING)),
+                )
+            )
+            if active >= self.max_active_per_user:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many unfinished AI jobs for this user",
+                    headers={"Retry-After": "5"},
+                )
+
+        use_cache = settings.ai_cache_enabled and not user.ai_cache_opt_out
+        cache_scope = ("" if settings.ai_cache_shared else str(user.id)) if use_cache else None
+        job = models.AIJob(
+            user_id=user.id,
+            idempotency_key=idempotency_key,
+            input_text=input_text,
+            status=models.AIJobStatus.QUEUED,
+            priority=ROLE_PRIORITY.get(user.role, max(ROLE_PRIORITY.values())),
+            attempts=0,
+            max_attempts=self.max_attempts,
+            run_at=time.time(),
+            cache_scope=cache_scope,
+        )
+        cached = ai_response_cache.lookup(input_text, cache_scope) if use_cache else None
+        if cached is not None:
+            job.status = models.AIJobStatus.SUCCEEDED
+            job.response = cached[0]
+            job.started_at = job.finished_at = func.now()
+            self.cache_hits += 1
+            interaction_log.record(user.id, "job", input_text, cached[0], cached[1])
+
+        db.add(job)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Lost a race with the same idempotency key
+            await db.rollback()
+            existing = await self._find_by_key(db, user.id, idempotency_key, input_text)
+            if existing is None:
+                raise
+            return existing, False
+        await db.refresh(job)
+        self.submitted += 1
+        if job.status == models.AIJobStatus.QUEUED and self._wakeup is not None:
+            self._wakeup.set()
+        return job, True
+
+    async def _find_by_key(
+        self, db: AsyncSession, user_id: int, idempotency_key: str, input_text: str
+    ) -> Optional[models.AIJob]:
+        result = await db.execute(
+            select(models.AIJob).where(
+                models.AIJob.user_id == user_id, models.AIJob.idempotency_key == idempotency_key
+            )
+        )
+        existing = result.scalar_one_or_none()
+        if existing is None:
+            return None
+        if existing.input_text != input_text:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Idempotency key was already used for a different input",
+            )
+        self.deduplicated += 1
+        return existing
+
+    async def get(self, job_id: int) -> Optional[models.AIJob]:
+        """Current state of a job, read on a session of its own."""
+        get_async_engine()
+        async with AsyncSessionLocal() as db:
+            return await db.get(models.AIJob, job_id)
+
+    async def wait_for_progress(self, job_id: int, timeout: float) -> None:
+        """Return when a worker in this process writes to the job, or after ``timeout``.
+
+        Workers in other processes are only seen by polling, so callers
+        re-read the job either way. Each call waits on an event of its own,
+        so followers of the same job come and go independently.
+        """
+        event = asyncio.Event()
+        waiters = self._progress.setdefault(job_id, set())
+        waiters.add(event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters.discard(event)
+            if not waiters and self._progress.get(job_id) is waiters:
+                del self._progress[job_id]
+
+    def _notify(self, job_id: int) -> None:
+        for event in self._progress.get(job_id, ()):
+            event.set()
+
+    # Running
+
+    async def claim(self) -> Optional[ClaimedJob]:
+        """Atomically take the next due queued job, or None."""
+        now = time.time()
+        job = models.AIJob
+        candidate = (
+            select(job.id)
+            .where(job.status == models.AIJobStatus.QUEUED, job.run_at <= now)
+            .order_by(job.priority, job.run_at, job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        statement = (
+            update(job)
+            .where(job.id == candidate, job.status == models.AIJobStatus.QUEUED)
+            .values(
+                status=models.AIJobStatus.RUNNING,
+                attempts=job.attempts + 1,
+                lease_expires_at=now + self.lease_seconds,
+                started_at=func.coalesce(job.started_at, func.now()),
+                response=None,
+            )
+            .returning(job.id, job.user_id, job.input_text, job.attempts, job.max_attempts, job.cache_scope)
+            .execution_options(synchronize_session=False)
+        )
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(statement)).first()
+            await db.commit()
+        return ClaimedJob(*row) if row is not None else None
+
+    async def _write(self, claimed: ClaimedJob, **values) -> bool:
+        """Update the job if ``claimed`` is still its current claim."""
+        job = models.AIJob
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(job)
+                .where(
+                    job.id == claimed.id,
+                    job.attempts == claimed.attempts,
+                    job.status == models.AIJobStatus.RUNNING,
+                )
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        self._notify(claimed.id)
+        return result.rowcount == 1
+
+    async def run(self, claimed: ClaimedJob) -> None:
+        # Jobs share the gateway's global and per-user limits with /ai/process
+        try:
+            slot = await agent_gateway.acquire(claimed.user_id)
+        except HTTPException as exc:
+            await self._defer(claimed, str(exc.detail), exc.headers)
+            return
+        try:
+            await self._stream(claimed)
+        finally:
+            slot.release()
+
+    async def _stream(self, claimed: ClaimedJob) -> None:
+        tokens = []
+        last_write = time.monotonic()
+        try:
+            async for token in agent_gateway.stream(claimed.input_text, claimed.user_id):
+                tokens.append(token)
+                if time.monotonic() - last_write >= self.progress_interval:
+                    last_write = time.monotonic()
+                    # Progress doubles as the lease heartbeat
+                    if not await self._write(
+                        claimed, response="".join(tokens), lease_expires_at=time.time() + self.lease_seconds
+                    ):
+                        logger.warning("AI job %d was reclaimed from this worker", claimed.id)
+                        return
+        except HTTPException as exc:
+            # 502/503/504 from the gateway are worth retrying; anything else is final
+            await self._fail(claimed, str(exc.detail), retry=exc.status_code >= 500)
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("AI job %d failed", claimed.id)
+            await self._fail(claimed, "Internal error while running the job", retry=True)
+            return
+
+        response_text = "".join(tokens)
+        if await self._write(
+            claimed,
+            status=models.AIJobStatus.SUCCEEDED,
+            response=response_text,
+            error=None,
+            lease_expires_at=None,
+            finished_at=func.now(),
+        ):
+            self.succeeded += 1
+            if claimed.cache_scope is not None:
+                ai_response_cache.store(claimed.input_text, response_text, claimed.cache_scope)
+            interaction_log.record(
+                claimed.user_id, "job", claimed.input_text, response_text,
+                "miss" if claimed.cache_scope is not None else "bypass",
+            )
+
+    async def _fail(self, claimed: ClaimedJob, error: str, retry: bool) -> None:
+        if retry and claimed.attempts < claimed.max_attempts:
+            delay = backoff(claimed.attempts, self.retry_backoff, self.retry_backoff_max)
+            if await self._write(
+                claimed,
+                status=models.AIJobStatus.QUEUED,
+                error=error,
+                lease_expires_at=None,
+                run_at=time.time() + delay,
+            ):
+                self.retried += 1
+            return
+        if await self._write(
+            claimed,
+            status=models.AIJobStatus.FAILED,
+            error=error,
+            lease_expires_at=None,
+            finished_at=func.now(),
+        ):
+            self.failed += 1
+
+    async def _defer(self, claimed: ClaimedJob, error: str, headers: Optional[Dict[str, str]]) -> None:
+        """Requeue a job the gateway had no room for, without using up an attempt.
+
+        Waits the gateway's Retry-After if it gave one, otherwise
+        ``retry_backoff``, plus up to half again so deferred jobs don't all
+        come back at once.
+        """
+        retry_after = float((headers or {}).get("Retry-After", 0))
+        delay = max(retry_after, self.retry_backoff) * random.uniform(1.0, 1.5)
+        job = models.AIJob
+        if await self._write(claimed, status=models.AIJobStatus.QUEUED, attempts=job.attempts - 1, error=error,
+                             lease_expires_at=None, run_at=time.time() + delay):
+            self.deferred += 1
+
+    async def _release(self, claimed: ClaimedJob) -> None:
+        """Hand an interrupted job straight back to the queue, without using up an attempt."""
+        job = models.AIJob
+        await self._write(claimed, status=models.AIJobStatus.QUEUED, attempts=job.attempts - 1,
+                          lease_expires_at=None, run_at=time.time())
+
+    async def reap(self) -> int:
+        """Requeue (or fail, if out of attempts) jobs whose claim expired."""
+        job = models.AIJob
+        expired = (job.status == models.AIJobStatus.RUNNING, job.lease_expires_at < time.time())
+        reclaimed = 0
+        async with AsyncSessionLocal() as db:
+            for out_of_attempts, values in (
+                (True, {"status": models.AIJobStatus.FAILED, "finished_at": func.now()}),
+                (False, {"status": models.AIJobStatus.QUEUED, "run_at": time.time()}),
+            ):
+                result = await db.execute(
+                    update(job)
+                    .where(*expired, (job.attempts >= job.max_attempts) == out_of_attempts)
+                    .values(error="Worker stopped responding", lease_expires_at=None, **values)
+                    .execution_options(synchronize_session=False)
+                )
+                reclaimed += result.rowcount
+            await db.commit()
+        if reclaimed:
+            logger.warning("Reclaimed %d AI job(s) from unresponsive workers", reclaimed)
+            self.reclaimed += reclaimed
+        return reclaimed
+
+    async def _work(self) -> None:
+        task = asyncio.current_task()
+        while not self._stopping:
+            try:
+                claimed = await self.claim()
+            except Exception as exc:
+                logger.warning("Could not claim an AI job: %s", exc)
+                claimed = None
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._workers[task] = claimed
+            try:
+                await self.run(claimed)
+            except asyncio.CancelledError:
+                await asyncio.shield(self._release(claimed))
+                raise
+            finally:
+                self._workers[task] = None
+
+    async def _reap_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 4)
+            try:
+                await self.reap()
+            except Exception as exc:
+                logger.warning("AI job reaper failed: %s", exc)
+
+    def start(self, workers: int) -> None:
+        if workers <= 0 or self._workers:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        for _ in range(workers):
+            self._workers[asyncio.ensure_future(self._work())] = None
+        self._reaper = asyncio.ensure_future(self._reap_forever())
+
+    async def stop(self, grace: float) -> None:
+        """Stop claiming, give running jobs ``grace`` seconds, then requeue the rest."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        if not self._workers:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        tasks = list(self._workers)
+        _, pending = await asyncio.wait(tasks, timeout=grace)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": len(self._workers),
+            "running": sum(1 for claimed in self._workers.values() if claimed is not None),
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "cache_hits": self.cache_hits,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "deferred": self.deferred,
+            "failed": self.failed,
+            "reclaimed": self.reclaimed,
+        }
+
+
+ai_jobs = AIJobQueue(
+    max_attempts=settings.ai_job_max_attempts,
+    retry_backoff=settings.ai_job_retry_backoff,
+    retry_backoff_max=settings.ai_job_retry_backoff_max,
+    lease_seconds=settings.ai_job_lease_seconds,
+    poll_interval=settings.ai_job_poll_interval,
+    progress_interval=settings.ai_job_progress_interval,
+    max_active_per_user=settings.ai_job_max_active_per_user,
+)
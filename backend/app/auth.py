@@ -1,20 +1,49 @@
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from functools import lru_cache
+from typing import Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas
 from .config import settings
+from .hashing import PasswordHasher
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# passlib/bcrypt and python-jose (with cryptography) are imported on first
+# use rather than with the app, which keeps worker start-up and CLI
+# commands that never hash or sign anything fast
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+
+    # Hashes below the configured cost are flagged by needs_update and rehashed on login
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=settings.password_hash_rounds,
+        bcrypt__min_rounds=settings.password_hash_rounds,
+    )
+
+password_hasher = PasswordHasher(
+    workers=settings.password_hash_workers,
+    max_concurrency=settings.password_hash_max_concurrency,
+    max_queue=settings.password_hash_max_queue,
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run("hash", get_password_hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -24,35 +53,56 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
+def decode_token(token: str) -> Optional[dict]:
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
     except JWTError:
         return None
+    if payload.get("sub") is None:
+        return None
+    return payload
+
+def verify_token(token: str) -> Optional[str]:
+    payload = decode_token(token)
+    if payload is None:
+        return None
+    return payload["sub"]
 
-def get_user(db: Session, email: str) -> Optional[models.User]:
-    return db.query(models.User).filter(models.User.email == email).first()
+async def get_user(db: AsyncSession, email: str) -> Optional[models.User]:
+    result = await db.execute(
+        select(models.User).where(func.lower(models.User.email) == email.lower()).limit(1)
+    )
+    return result.scalars().first()
+
+async def update_password_hash(db: AsyncSession, user: models.User, hashed_password: str) -> models.User:
+    user.hashed_password = hashed_password
+    await db.commit()
+    await db.refresh(user)
+    return user
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[models.User]:
-    user = get_user(db, email)
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[models.User]:
+    user = await get_user(db, email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await password_hasher.run(
+        "verify", verify_and_update_password, password, user.hashed_password
+    )
+    if not verified:
         return None
+    if new_hash:
+        # The stored hash uses outdated settings (e.g. a lower bcrypt cost)
+        user = await update_password_hash(db, user, new_hash)
     return user
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
-    hashed_password = get_password_hash(user.password)
+async def create_user(db: AsyncSession, user: schemas.UserCreate, hashed_password: str) -> models.User:
     db_user = models.User(
         email=user.email,
         name=user.name,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user 
\ No newline at end of file
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
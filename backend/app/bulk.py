@@ -0,0 +1,268 @@
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Request, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import schemas
+from .config import settings
+from .database import Base, read_session
+
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+CSV_TYPES = {"text/csv"}
+
+
+def request_format(request: Request) -> str:
+    content_type = request.headers.get("content-type", "application/x-ndjson")
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type in CSV_TYPES:
+        return "csv"
+    if content_type in NDJSON_TYPES:
+        return "ndjson"
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Send application/x-ndjson or text/csv",
+    )
+
+
+async def iter_lines(request: Request) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8", errors="replace").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace").rstrip("\r")
+
+
+async def iter_records(request: Request, fmt: str) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Yield ``(row_number, record, error)`` for each row of the body as it arrives."""
+    row = 0
+    if fmt == "ndjson":
+        async for line in iter_lines(request):
+            if not line.strip():
+                continue
+            row += 1
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield row, None, f"Invalid JSON: {exc}"
+                continue
+            if not isinstance(record, dict):
+                yield row, None, "Expected a JSON object"
+                continue
+            yield row, record, None
+        return
+
+    header: Optional[List[str]] = None
+    pending: List[str] = []
+    async for line in iter_lines(request):
+        pending.append(line)
+        chunk = "\n".join(pending)
+        # An odd number of quotes means a quoted field continues on the next line
+        if chunk.count('"') % 2:
+            continue
+        pending = []
+        if not chunk.strip():
+            continue
+        values = next(csv.reader([chunk]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row += 1
+        if len(values) != len(header):
+            yield row, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        # Empty cells fall back to the schema defaults
+        yield row, {name: value for name, value in zip(header, values) if value != ""}, None
+    if pending:
+        yield row + 1, None, "Unterminated quoted field"
+
+
+class ImportReport:
+    def __init__(self, max_errors: int):
+        self.max_errors = max_errors
+        self.received = 0
+        self.created = 0
+        self.upserted = 0
+        self.failed = 0
+        self.errors: List[schemas.BulkRowError] = []
+        self.errors_truncated = False
+
+    def fail(self, row: int, errors: List[str]) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(schemas.BulkRowError(row=row, errors=errors))
+        else:
+            self.errors_truncated = True
+
+    def result(self) -> schemas.BulkImportResult:
+        return schemas.BulkImportResult(
+            received=self.received,
+            created=self.created,
+            upserted=self.upserted,
+            failed=self.failed,
+            errors=self.errors,
+            errors_truncated=self.errors_truncated,
+        )
+
+
+def validation_messages(exc: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()]
+
+
+def copy_value(value: Any) -> Any:
+    # asyncpg takes json/jsonb as text
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+async def copy_rows(db: AsyncSession, model: Type[Base], rows: List[Dict[str, Any]]) -> None:
+    """Plain inserts: COPY on PostgreSQL, multi-row INSERT elsewhere."""
+    if db.bind.dialect.name == "postgresql":
+        columns = list(rows[0])
+        connection = await db.connection()
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            model.__tablename__,
+            records=[tuple(copy_value(values[column]) for column in columns) for values in rows],
+            columns=columns,
+        )
+    else:
+        await db.execute(insert(model), rows)
+
+
+async def upsert_rows(db: AsyncSession, model: Type[Base], rows: List[Dict[str, Any]]) -> None:
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        statement = postgresql.insert(model)
+    elif dialect == "sqlite":
+        statement = sqlite.insert(model)
+    else:
+        raise HTTPException(status_code=501, detail=f"Upserts are not supported on {dialect}")
+    updates = {column: statement.excluded[column] for column in rows[0] if column != "id"}
+    updates["updated_at"] = func.now()
+    await db.execute(statement.on_conflict_do_update(index_elements=["id"], set_=updates), rows)
+
+
+async def write_rows(db: AsyncSession, model: Type[Base], rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+    new_rows = [{k: v for k, v in values.items() if k != "id"} for values in rows if values.get("id") is None]
+    keyed_rows = [values for values in rows if values.get("id") is not None]
+    if new_rows:
+        await copy_rows(db, model, new_rows)
+    if keyed_rows:
+        await upsert_rows(db, model, keyed_rows)
+    return len(new_rows), len(keyed_rows)
+
+
+async def write_batch(
+    db: AsyncSession,
+    model: Type[Base],
+    batch: List[Tuple[int, Dict[str, Any]]],
+    report: ImportReport,
+) -> None:
+    try:
+        created, upserted = await write_rows(db, model, [values for _, values in batch])
+        await db.commit()
+        report.created += created
+        report.upserted += upserted
+        return
+    except SQLAlchemyError:
+        await db.rollback()
+
+    # Something in the batch violates a constraint; retry row by row to find it
+    for row, values in batch:
+        try:
+            async with db.begin_nested():
+                created, upserted = await write_rows(db, model, [values])
+        except SQLAlchemyError as exc:
+            report.fail(row, [str(getattr(exc, "orig", exc)).strip()])
+            continue
+        report.created += created
+        report.upserted += upserted
+    await db.commit()
+
+
+async def sync_id_sequence(db: AsyncSession, model: Type[Base]) -> None:
+    # Explicit ids bypass the serial sequence; move it past them
+    if db.bind.dialect.name == "postgresql":
+        table = model.__tablename__
+        await db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"coalesce((SELECT max(id) FROM {table}), 1))"
+        ))
+        await db.commit()
+
+
+async def import_records(
+    request: Request,
+    db: AsyncSession,
+    model: Type[Base],
+    schema: Type[BaseModel],
+) -> schemas.BulkImportResult:
+    fmt = request_format(request)
+    report = ImportReport(settings.bulk_max_reported_errors)
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+
+    async for row, record, error in iter_records(request, fmt):
+        report.received += 1
+        if error is not None:
+            report.fail(row, [error])
+            continue
+        try:
+            batch.append((row, schema.model_validate(record).model_dump()))
+        except ValidationError as exc:
+            report.fail(row, validation_messages(exc))
+            continue
+        if len(batch) >= settings.bulk_batch_size:
+            await write_batch(db, model, batch, report)
+            batch = []
+
+    if batch:
+        await write_batch(db, model, batch, report)
+    if report.upserted:
+        await sync_id_sequence(db, model)
+    return report.result()
+
+
+def csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+async def export_records(model: Type[Base], schema: Type[BaseModel], fmt: str) -> AsyncIterator[bytes]:
+    """Stream every row through a server-side cursor, one partition at a time."""
+    fields = list(schema.model_fields)
+    # Table names double as the response-cache namespaces written to
+    async with read_session(model.__tablename__) as db:
+        result = await db.stream(
+            select(model).order_by(model.id).execution_options(yield_per=settings.bulk_batch_size)
+        )
+        if fmt == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(fields)
+            yield buffer.getvalue().encode()
+
+        async for partition in result.scalars().partitions():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer) if fmt == "csv" else None
+            for obj in partition:
+                # Stored fields only (no computed image URLs), so exports re-import as they are
+                values = schema.model_validate(obj).model_dump(mode="json", include=set(fields))
+                if writer is not None:
+                    writer.writerow([csv_value(values[name]) for name in fields])
+                else:
+                    buffer.write(json.dumps(values, ensure_ascii=False, separators=(",", ":")))
+                    buffer.write("\n")
+            yield buffer.getvalue().encode()
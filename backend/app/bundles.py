@@ -0,0 +1,39 @@
+"""What each frontend page needs, for GET /pages/{page}/bundle.
+
+A bundle is the page's content rows, optionally a slice of products and
+optionally the signed-in user, fetched concurrently and returned as one
+response so a navigation costs one round trip. Adding a page, or giving a
+page products, is a change to ``PAGE_BUNDLES`` only.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from .config import settings
+
+
+@dataclass(frozen=True)
+class ProductSlice:
+    """Active products in id order, like the first page of /products."""
+
+    limit: int
+    category: Optional[str] = None
+
+    def cache_key(self) -> str:
+        return f"slice:{self.category or ''}:{self.limit}"
+
+
+@dataclass(frozen=True)
+class PageBundle:
+    content: bool = True
+    products: Optional[ProductSlice] = None
+    # Include the current user when the request carries a token
+    user: bool = True
+
+
+PAGE_BUNDLES: Dict[str, PageBundle] = {
+    "home": PageBundle(products=ProductSlice(limit=6)),
+    "about": PageBundle(),
+    "contact": PageBundle(),
+    "products": PageBundle(products=ProductSlice(limit=settings.products_page_size)),
+}
@@ -0,0 +1,220 @@
+"""Content-Encoding for JSON responses.
+
+The encoding is negotiated from Accept-Encoding among
+``settings.compression_encodings`` (br and zstd only when the brotli and
+zstandard packages are installed; gzip always). Bodies smaller than
+``compression_min_size`` go out as they are. For cached responses the
+compressed bodies are kept in the entry's ``variants``, so a cached body
+is compressed once per encoding rather than once per request, and is
+dropped with the entry when its namespace is bumped.
+"""
+
+import asyncio
+import gzip
+import threading
+import time
+from importlib.util import find_spec
+from typing import Callable, Dict, List, MutableMapping, Optional, Tuple
+
+from fastapi import Request, Response
+
+from .config import settings
+from .metrics import route_label, timer
+
+# Bodies this large are compressed in a thread so they don't stall the event loop
+THREAD_THRESHOLD = 256 * 1024
+
+
+def _gzip(body: bytes) -> bytes:
+    # mtime=0 keeps the output, and so its ETag, stable across compressions
+    return gzip.compress(body, compresslevel=settings.compression_gzip_level, mtime=0)
+
+
+def _brotli(body: bytes) -> bytes:
+    import brotli
+    return brotli.compress(body, quality=settings.compression_brotli_quality)
+
+
+def _zstd(body: bytes) -> bytes:
+    import zstandard
+    return zstandard.ZstdCompressor(level=settings.compression_zstd_level).compress(body)
+
+
+CODECS: Dict[str, Tuple[Optional[str], Callable[[bytes], bytes]]] = {
+    "br": ("brotli", _brotli),
+    "zstd": ("zstandard", _zstd),
+    "gzip": (None, _gzip),
+}
+
+
+def available_encodings(preferred: List[str]) -> List[str]:
+    """``preferred`` minus unknown encodings and those whose package is missing."""
+    return [
+        name for name in preferred
+        if name in CODECS and (CODECS[name][0] is None or find_spec(CODECS[name][0]) is not None)
+    ]
+
+
+def negotiate(accept_encoding: Optional[str], encodings: List[str]) -> Optional[str]:
+    """The encoding to use for a request, or None for identity.
+
+    Picks the highest q-value among ``encodings``; ties go to the earlier
+    one in ``encodings``. ``*`` covers encodings not listed by name and
+    q=0 rules an encoding out.
+    """
+    if not accept_encoding or not encodings:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            weights[name] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for name in encodings:
+        q = weights.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    """A strong ETag per representation: the identity tag with the encoding appended."""
+    if encoding is None:
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+class RouteStats:
+    __slots__ = ("compressed", "reused", "skipped", "bytes_in", "bytes_out", "cpu_seconds")
+
+    def __init__(self):
+        self.compressed = 0
+        self.reused = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+
+class ResponseCompressor:
+    def __init__(self, enabled: bool, encodings: List[str], min_size: int):
+        self.enabled = enabled
+        self.encodings = available_encodings(encodings)
+        self.min_size = min_size
+        self._routes: Dict[str, RouteStats] = {}
+        self._lock = threading.Lock()
+
+    def _route(self, request: Request) -> RouteStats:
+        route = route_label(request.scope)
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = RouteStats()
+            return stats
+
+    def choose(self, request: Request, size: int) -> Optional[str]:
+        """The encoding for a ``size``-byte body, or None to send it as is."""
+        if not self.enabled:
+            return None
+        encoding = negotiate(request.headers.get("accept-encoding"), self.encodings)
+        if encoding is not None and size < self.min_size:
+            self._route(request).skipped += 1
+            return None
+        return encoding
+
+    async def encode(self, request: Request, body: bytes, encoding: str,
+                     variants: Optional[MutableMapping[str, bytes]] = None) -> bytes:
+        """``body`` compressed with ``encoding``, reusing and filling ``variants``."""
+        stats = self._route(request)
+        if variants is not None:
+            encoded = variants.get(encoding)
+            if encoded is not None:
+                stats.reused += 1
+                return encoded
+        codec = CODECS[encoding][1]
+
+        def run() -> Tuple[bytes, float]:
+            started = time.thread_time()
+            return codec(body), time.thread_time() - started
+
+        with timer("compress"):
+            if len(body) >= THREAD_THRESHOLD:
+                encoded, cpu = await asyncio.to_thread(run)
+            else:
+                encoded, cpu = run()
+        stats.compressed += 1
+        stats.bytes_in += len(body)
+        stats.bytes_out += len(encoded)
+        stats.cpu_seconds += cpu
+        if variants is not None:
+            variants[encoding] = encoded
+        return encoded
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            routes = dict(self._routes)
+        bytes_in = sum(stats.bytes_in for stats in routes.values())
+        bytes_out = sum(stats.bytes_out for stats in routes.values())
+        return {
+            "compressed": sum(stats.compressed for stats in routes.values()),
+            "reused": sum(stats.reused for stats in routes.values()),
+            "skipped": sum(stats.skipped for stats in routes.values()),
+            "bytes_in": bytes_in,
+            "bytes_out": bytes_out,
+            "cpu_seconds": round(sum(stats.cpu_seconds for stats in routes.values()), 6),
+            "encodings": list(self.encodings),
+            "routes": {
+                route: {
+                    "compressed": stats.compressed,
+                    "reused": stats.reused,
+                    "skipped": stats.skipped,
+                    "bytes_in": stats.bytes_in,
+                    "bytes_out": stats.bytes_out,
+                    "cpu_seconds": round(stats.cpu_seconds, 6),
+                    "ratio": round(stats.bytes_in / stats.bytes_out, 2) if stats.bytes_out else None,
+                    "cpu_ms_per_compression": (
+                        round(stats.cpu_seconds * 1000 / stats.compressed, 3) if stats.compressed else None
+                    ),
+                }
+                for route, stats in sorted(routes.items())
+            },
+        }
+
+
+response_compressor = ResponseCompressor(
+    enabled=settings.compression_enabled,
+    encodings=settings.compression_encodings,
+    min_size=settings.compression_min_size,
+)
+
+
+def vary_on_encoding(headers: Dict[str, str]) -> Dict[str, str]:
+    """Add Accept-Encoding to ``headers``' Vary when responses may be compressed."""
+    if response_compressor.enabled:
+        vary = headers.get("Vary")
+        headers["Vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+    return headers
+
+
+async def json_response(request: Request, body: bytes, headers: Dict[str, str],
+                        encoding: Optional[str] = None,
+                        variants: Optional[MutableMapping[str, bytes]] = None) -> Response:
+    """A JSON response with ``body`` in ``encoding`` (see ResponseCompressor.choose).
+
+    ``headers`` should already carry the representation's ETag, if any.
+    """
+    vary_on_encoding(headers)
+    if encoding is not None:
+        body = await response_compressor.encode(request, body, encoding, variants)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
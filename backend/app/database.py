@@ -1,16 +1,265 @@
-from sqlalchemy import create_engine
+import asyncio
+import itertools
+import logging
+import time
+from typing import Dict, List, Optional
+from sqlalchemy import Select, create_engine, event, text
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from .config import settings
+from .metrics import TimedAsyncQueuePool, TimedQueuePool, instrument_engine
+from .shared_counters import SharedCounters
 
-engine = create_engine(settings.database_url)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+logger = logging.getLogger(__name__)
+
+# Async driver used when ASYNC_DATABASE_URL is not set explicitly
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_url(url: str) -> URL:
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if drivername is None:
+        raise ValueError(f"No async driver configured for {parsed.drivername}")
+    return parsed.set(drivername=drivername)
+
+def pool_options(url: URL) -> dict:
+    # SQLite uses its own single-file pool; sizing options don't apply
+    if url.get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        # Queue pools that also record checkout wait for /metrics
+        "poolclass": TimedAsyncQueuePool if url.get_dialect().is_async else TimedQueuePool,
+    }
+
+# Engines are built on first use (the app builds the async one in its
+# lifespan), so importing the app creates no pools and loads no DB drivers.
+# ``from app.database import engine`` still works through __getattr__.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+class RoutingSession(Session):
+    """Sends plain SELECTs to the replica in ``info["replica"]`` and
+    everything else (flushes, DML, SELECT ... FOR UPDATE, raw SQL) to the
+    primary, so a read session can never write to a replica."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if (
+            replica is None
+            or self._flushing
+            or not isinstance(clause, Select)
+            or clause._for_update_arg is not None
+        ):
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+        return replica.sync_engine
+
+ReadSessionLocal = async_sessionmaker(sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False)
+
+def get_engine() -> Engine:
+    """Sync engine for scripts (setup_db.py) and migrations"""
+    global engine
+    if "engine" not in globals():
+        url = make_url(settings.database_url)
+        engine = create_engine(url, **pool_options(url))
+        if settings.metrics_enabled:
+            instrument_engine(engine)
+        SessionLocal.configure(bind=engine)
+    return engine
+
+def get_async_engine() -> AsyncEngine:
+    global async_engine
+    if "async_engine" not in globals():
+        url = make_url(settings.async_database_url) if settings.async_database_url else get_async_url(settings.database_url)
+        async_engine = create_async_engine(url, **pool_options(url))
+        if settings.metrics_enabled:
+            instrument_engine(async_engine.sync_engine)
+        AsyncSessionLocal.configure(bind=async_engine)
+        ReadSessionLocal.configure(bind=async_engine)
+        replicas.build(settings.database_replica_urls)
+    return async_engine
+
+def dialect_name() -> str:
+    """Backend of the configured database, without building an engine"""
+    return make_url(settings.async_database_url or settings.database_url).get_backend_name()
+
+def __getattr__(name: str):
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 Base = declarative_base()
 
 def get_db():
+    get_engine()
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    get_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Read replicas
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+class Replica:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.name = engine.url.render_as_string(hide_password=True)
+        self.healthy = True
+        self.lag: Optional[float] = None
+        self.reads = 0
+
+class ReplicaSet:
+    """Round-robin over the replicas that passed their last health check.
+
+    A background task runs ``SELECT 1`` (plus a replay-lag query on
+    PostgreSQL) against each replica every ``replica_check_interval``; a
+    replica that fails, times out or lags more than
+    ``replica_max_lag_seconds`` is skipped until it passes again. A
+    connection error on a replica takes it out of rotation at once. With
+    no healthy replica, reads fall back to the primary.
+    """
+
+    def __init__(self):
+        self.members: List[Replica] = []
+        self.fallbacks = 0
+        self._turn = itertools.count()
+        self._monitor: Optional[asyncio.Task] = None
+
+    def build(self, urls: List[str]) -> None:
+        for url in urls:
+            parsed = get_async_url(url)
+            engine = create_async_engine(parsed, **pool_options(parsed))
+            if settings.metrics_enabled:
+                instrument_engine(engine.sync_engine)
+            replica = Replica(engine)
+            event.listen(engine.sync_engine, "handle_error", self._on_error(replica))
+            self.members.append(replica)
+
+    def _on_error(self, replica: Replica):
+        def handle_error(context):
+            # No connection means connecting failed
+            if context.is_disconnect or context.connection is None:
+                if replica.healthy:
+                    logger.warning("Replica %s unreachable, reading from the others", replica.name)
+                replica.healthy = False
+        return handle_error
+
+    def choose(self) -> Optional[AsyncEngine]:
+        for _ in range(len(self.members)):
+            replica = self.members[next(self._turn) % len(self.members)]
+            if replica.healthy:
+                replica.reads += 1
+                return replica.engine
+        if self.members:
+            self.fallbacks += 1
+        return None
+
+    async def _probe(self, replica: Replica) -> None:
+        async with replica.engine.connect() as conn:
+            if replica.engine.dialect.name == "postgresql":
+                replica.lag = float((await conn.execute(REPLICA_LAG_SQL)).scalar() or 0)
+            else:
+                await conn.execute(text("SELECT 1"))
+                replica.lag = 0.0
+
+    async def check(self) -> None:
+        for replica in self.members:
+            try:
+                await asyncio.wait_for(self._probe(replica), settings.replica_check_timeout)
+                healthy = replica.lag <= settings.replica_max_lag_seconds
+            except Exception as exc:
+                logger.debug("Replica %s failed its health check: %s", replica.name, exc)
+                healthy = False
+            if healthy != replica.healthy:
+                logger.warning("Replica %s is %s", replica.name, "back" if healthy else "out of rotation")
+            replica.healthy = healthy
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.replica_check_interval)
+            await self.check()
+
+    async def start(self) -> None:
+        if self.members:
+            await self.check()
+            self._monitor = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        for replica in self.members:
+            await replica.engine.dispose()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "replicas": len(self.members),
+            "healthy": sum(replica.healthy for replica in self.members),
+            "replica_reads": sum(replica.reads for replica in self.members),
+            "fallbacks": self.fallbacks,
+            "read_your_writes": recent_writes.hits,
+        }
+
+class RecentWrites:
+    """When each key (a cache namespace or ``user:<email>``) was last written.
+
+    Kept in shared memory so a write in one preloaded worker also sends the
+    other workers' reads to the primary. Keys share slots, so a collision
+    only sends a few extra reads to the primary.
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window_ms = int(window_seconds * 1000)
+        self.hits = 0
+        self._clock = SharedCounters(slots=4096)
+
+    def note(self, *keys: str) -> None:
+        now = int(time.time() * 1000)
+        for key in keys:
+            self._clock.set(key, now)
+
+    def active(self, keys) -> bool:
+        now = int(time.time() * 1000)
+        if any(now - self._clock.get(key) < self.window_ms for key in keys):
+            self.hits += 1
+            return True
+        return False
+
+replicas = ReplicaSet()
+recent_writes = RecentWrites(settings.read_your_writes_seconds)
+
+def read_session(*keys: str) -> AsyncSession:
+    """Session for read-only work, on a replica unless one of ``keys`` was
+    written within the read-your-writes window (or no replica is healthy)."""
+    get_async_engine()
+    replica = None
+    if replicas.members and not recent_writes.active(keys):
+        replica = replicas.choose()
+    return ReadSessionLocal(info={"replica": replica})
+
+def read_db(*keys: str):
+    """Dependency yielding a ``read_session(*keys)``"""
+    async def get_read_db():
+        async with read_session(*keys) as db:
+            yield db
+    return get_read_db
@@ -1,40 +1,62 @@
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import auth, models
-from .database import get_db
+from .database import get_async_db
+from .metrics import timer
+from .token_cache import UserSnapshot, token_cache
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> models.User:
+    db: AsyncSession = Depends(get_async_db)
+) -> UserSnapshot:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    email = auth.verify_token(credentials.credentials)
-    if email is None:
-        raise credentials_exception
-    
-    user = auth.get_user(db, email=email)
-    if user is None:
-        raise credentials_exception
-    
-    return user
+    token = credentials.credentials
+    with timer("auth"):
+        cached_user = token_cache.get(token)
+        if cached_user is not None:
+            return cached_user
+        
+        payload = auth.decode_token(token)
+        if payload is None:
+            raise credentials_exception
+        
+        user = await auth.get_user(db, email=payload["sub"])
+        if user is None:
+            raise credentials_exception
+        
+        snapshot = UserSnapshot.from_user(user)
+        token_cache.set(token, payload, snapshot)
+        return snapshot
 
-def get_current_active_user(current_user: models.User = Depends(get_current_user)) -> models.User:
+async def get_current_active_user(current_user: UserSnapshot = Depends(get_current_user)) -> UserSnapshot:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-def get_super_user(current_user: models.User = Depends(get_current_active_user)) -> models.User:
+async def get_super_user(current_user: UserSnapshot = Depends(get_current_active_user)) -> UserSnapshot:
     if current_user.role != models.UserRole.SUPER_USER:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    return current_user 
\ No newline at end of file
+    return current_user
+
+async def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: AsyncSession = Depends(get_async_db)
+) -> Optional[UserSnapshot]:
+    """The active user for routes that also serve anonymous requests; a
+    token that is sent must still be valid."""
+    if credentials is None:
+        return None
+    return await get_current_active_user(await get_current_user(credentials, db))
@@ -0,0 +1,72 @@
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.expression import Executable
+
+from . import models
+
+Stats = models.ProductCategoryStats
+Product = models.Product
+
+
+def category_stats_statements(dialect: str, categories: Optional[Iterable[str]] = None) -> List[Executable]:
+    """Statements that recompute the stats rows for ``categories`` (every category when None).
+
+    Min/max cannot be maintained by deltas once rows are deleted or
+    deactivated, so each touched category is re-aggregated; with
+    ix_products_category_active that reads only that category's rows.
+    """
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    statements: List[Executable] = []
+    if categories is not None:
+        categories = sorted(set(categories))
+        if not categories:
+            return statements
+        statements.append(
+            insert(Stats).values([{"category": category, "product_count": 0} for category in categories])
+            .on_conflict_do_nothing()
+        )
+
+    # Row locks make concurrent writers to one category aggregate in turn,
+    # each seeing the other's committed products
+    locked = select(Stats.category).order_by(Stats.category).with_for_update()
+    aggregates = (
+        select(
+            Product.category,
+            func.count(),
+            func.min(Product.price),
+            func.max(Product.price),
+            func.avg(Product.rating),
+        )
+        .where(Product.is_active == True)
+        .group_by(Product.category)
+    )
+    stale = delete(Stats).where(~exists().where(Product.category == Stats.category, Product.is_active == True))
+    if categories is not None:
+        locked = locked.where(Stats.category.in_(categories))
+        aggregates = aggregates.where(Product.category.in_(categories))
+        stale = stale.where(Stats.category.in_(categories))
+
+    upsert = insert(Stats).from_select(
+        ["category", "product_count", "min_price", "max_price", "avg_rating"], aggregates
+    )
+    upsert = upsert.on_conflict_do_update(
+        index_elements=["category"],
+        set_={
+            "product_count": upsert.excluded.product_count,
+            "min_price": upsert.excluded.min_price,
+            "max_price": upsert.excluded.max_price,
+            "avg_rating": upsert.excluded.avg_rating,
+            "updated_at": func.now(),
+        },
+    )
+    statements.extend([locked, upsert, stale.execution_options(synchronize_session=False)])
+    return statements
+
+
+async def refresh_category_stats(db: AsyncSession, categories: Optional[Iterable[str]] = None) -> None:
+    """Recompute stats in the caller's transaction, so they commit with the product write."""
+    for statement in category_stats_statements(db.bind.dialect.name, categories):
+        await db.execute(statement)
@@ -0,0 +1,48 @@
+import json
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy import String, and_, cast, exists, func, literal, literal_column, select, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+def parse_contains(raw: str) -> Any:
+    """``features.contains`` takes JSON; a bare word means ``["word"]``."""
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        return [raw]
+    if isinstance(value, (list, dict)):
+        return value
+    return [value]
+
+
+def json_contains(column, value: Any, dialect: str):
+    """``column @> value``, pushed down to the database.
+
+    PostgreSQL uses jsonb containment (served by the GIN index). SQLite
+    gets the same answer from json_each/json_extract for arrays of
+    scalars and flat objects, which is what the catalog stores.
+    """
+    if dialect == "postgresql":
+        # Bound as text and cast, so the statement also renders with literal_binds
+        return type_coerce(column, JSONB).contains(cast(literal(json.dumps(value), String), JSONB))
+
+    if isinstance(value, dict):
+        clauses = []
+        for key, expected in value.items():
+            if isinstance(expected, (list, dict)):
+                raise HTTPException(status_code=400, detail="Nested features filters need PostgreSQL")
+            path = '$."%s"' % key.replace('"', '\\"')
+            clauses.append(func.json_extract(column, path) == expected)
+        return and_(*clauses)
+
+    clauses = []
+    for expected in value:
+        if isinstance(expected, (list, dict)):
+            raise HTTPException(status_code=400, detail="Nested features filters need PostgreSQL")
+        element = func.json_each(column).table_valued("value")
+        clauses.append(
+            exists(select(literal_column("1")).select_from(element).where(element.c.value == expected))
+        )
+    return and_(*clauses)
@@ -0,0 +1,100 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, status
+
+
+class PasswordHasher:
+    """Runs bcrypt work in a worker pool so it never blocks the event loop.
+
+    At most ``max_concurrency`` operations run at once and at most
+    ``max_queue`` callers may wait for a slot; anything beyond that is
+    rejected with a 429 instead of piling up behind the pool.
+    """
+
+    def __init__(self, workers: int, max_concurrency: int, max_queue: int):
+        self.workers = workers
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def start(self) -> Executor:
+        if self._executor is None:
+            if self.workers > 0:
+                # spawn, not fork: the server process is multi-threaded by now
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix="password-hasher",
+                )
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, operation: str, func: Callable[..., Any], *args: Any) -> Any:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many authentication requests, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        queued_at = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        started_at = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.start(), func, *args)
+        finally:
+            self._semaphore.release()
+            self._record(operation, started_at - queued_at, time.perf_counter() - started_at)
+
+    def _record(self, operation: str, wait: float, duration: float) -> None:
+        stats = self._stats.setdefault(
+            operation, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "wait_seconds": 0.0}
+        )
+        stats["count"] += 1
+        stats["total_seconds"] += duration
+        stats["max_seconds"] = max(stats["max_seconds"], duration)
+        stats["wait_seconds"] += wait
+
+    def snapshot(self) -> Dict[str, Any]:
+        operations = {}
+        for operation, stats in self._stats.items():
+            count = stats["count"] or 1
+            operations[operation] = {
+                "count": int(stats["count"]),
+                "avg_ms": round(stats["total_seconds"] / count * 1000, 3),
+                "max_ms": round(stats["max_seconds"] * 1000, 3),
+                "avg_wait_ms": round(stats["wait_seconds"] / count * 1000, 3),
+            }
+        return {
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "waiting": self._waiting,
+            "rejected": self.rejected,
+            "operations": operations,
+        }
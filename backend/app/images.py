@@ -0,0 +1,335 @@
+"""Resized WebP variants of Content.image_url and Product.image_url.
+
+An image_url that is a local path (no scheme or host) names a file under
+``settings.image_source_dir``. Content and product responses list its
+variants as ``/images/{variant}/{path}?v={fingerprint}`` URLs (see
+``variant_urls`` and ``srcset``); the fingerprint changes with the file,
+so a URL whose fingerprint is current is served as immutable.
+
+Variants are rendered on first request in a worker pool and kept in a
+content-addressed disk cache: a file is named after the SHA-256 of the
+original plus the variant's width and quality, so identical originals
+share their variants and an edited original never serves an old one.
+Past ``image_cache_max_bytes`` the least recently used files are deleted;
+hits refresh a file's mtime, which keeps that order meaningful across
+workers sharing the directory.
+"""
+
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import posixpath
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import BinaryIO, Dict, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit
+
+import anyio
+from fastapi import HTTPException, Response, status
+
+from .config import settings
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Largest width of each variant; narrower originals are re-encoded, not enlarged
+VARIANTS: Dict[str, int] = {"thumbnail": 160, "card": 480, "full": 1600}
+SOURCE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+IMMUTABLE = "public, max-age=31536000, immutable"
+# For URLs carrying an old fingerprint, which may yet change again
+REVALIDATE = "public, max-age=60"
+FINGERPRINT_TTL = 10.0
+# Cache hits refresh a file's mtime at most this often
+TOUCH_INTERVAL = 3600
+# Eviction goes this far below the limit so it doesn't run on every render
+EVICT_TO = 0.9
+
+_fingerprints: Dict[str, Tuple[float, Optional[str]]] = {}
+
+
+def source_path(image_url: Optional[str]) -> Optional[str]:
+    """The image's path under image_source_dir, or None for remote URLs and non-images."""
+    if not image_url or not settings.images_enabled:
+        return None
+    parts = urlsplit(image_url)
+    if parts.scheme or parts.netloc:
+        return None
+    path = posixpath.normpath(unquote(parts.path).lstrip("/"))
+    if path in (".", "..") or path.startswith("../") or not path.lower().endswith(SOURCE_EXTENSIONS):
+        return None
+    return path
+
+
+def fingerprint(path: str) -> Optional[str]:
+    """Short token that changes with the source file; None if it is missing."""
+    now = time.monotonic()
+    cached = _fingerprints.get(path)
+    if cached is not None and now - cached[0] < FINGERPRINT_TTL:
+        return cached[1]
+    try:
+        stat = os.stat(os.path.join(settings.image_source_dir, *path.split("/")))
+        token = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+    except OSError:
+        token = None
+    if len(_fingerprints) >= 10000:
+        _fingerprints.clear()
+    _fingerprints[path] = (now, token)
+    return token
+
+
+def variant_urls(image_url: Optional[str]) -> Optional[Dict[str, str]]:
+    """URL of each variant of a local image, or None when there is none to resize."""
+    path = source_path(image_url)
+    token = fingerprint(path) if path is not None else None
+    if token is None:
+        return None
+    quoted = quote(path)
+    return {name: f"{settings.image_base_url}/images/{name}/{quoted}?v={token}" for name in VARIANTS}
+
+
+def srcset(image_url: Optional[str]) -> Optional[str]:
+    """``variant_urls`` as an <img srcset> value."""
+    urls = variant_urls(image_url)
+    if urls is None:
+        return None
+    return ", ".join(f"{url} {VARIANTS[name]}w" for name, url in urls.items())
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def render_variant(source: str, target: str, width: int, quality: int, max_pixels: int) -> int:
+    """Write ``source`` scaled down to ``width`` as WebP at ``target``; returns its size.
+
+    Runs in the worker pool, so Pillow is only ever imported there.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    partial = f"{target}.{os.getpid()}.tmp"
+    with Image.open(source) as original:
+        # Let JPEGs decode at a reduced scale; a square box keeps enough
+        # pixels whichever way EXIF orientation turns the image
+        original.draft("RGB", (width, width))
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail((width, image.height), Image.LANCZOS)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+        try:
+            image.save(partial, "WEBP", quality=quality, method=4)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+    # Readers see either no file or the whole one
+    os.replace(partial, target)
+    return os.path.getsize(target)
+
+
+class ImageVariants:
+    def __init__(self, source_dir: str, cache_dir: str, max_bytes: int, workers: int,
+                 quality: int, max_pixels: int, render_timeout: float):
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.quality = quality
+        self.max_pixels = max_pixels
+        self.hits = 0
+        self.rendered = 0
+        self.failures = 0
+        self.evicted = 0
+        self.render_seconds = 0.0
+        self._executor: Optional[Executor] = None
+        self._flights = SingleFlight(timeout=render_timeout, detail="Timed out resizing the image")
+        self._digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._cached_bytes: Optional[int] = None
+        self._evicting = False
+
+    def start(self) -> Executor:
+        if self._executor is None:
+            if self.workers > 0:
+                # spawn, not fork: the server process is multi-threaded by now
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-variants")
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def source_file(self, path: str) -> str:
+        root = os.path.realpath(self.source_dir)
+        source = os.path.realpath(os.path.join(root, *path.split("/")))
+        # realpath resolves symlinks, so a link can't reach outside the source directory either
+        if not source.startswith(root + os.sep) or not os.path.isfile(source):
+            raise HTTPException(status_code=404, detail="Image not found")
+        return source
+
+    async def _digest(self, source: str) -> str:
+        stat = os.stat(source)
+        key = (source, stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = await asyncio.to_thread(file_digest, source)
+            self._digests[key] = digest
+            while len(self._digests) > 10000:
+                self._digests.popitem(last=False)
+        return digest
+
+    async def open(self, path: str, variant: str) -> Tuple[BinaryIO, str, str]:
+        """An open cache file holding ``variant`` of the image at ``path``,
+        its ETag and its path relative to the cache directory.
+
+        The file is opened here so that an eviction racing the response
+        can't delete it out from under the send.
+        """
+        source = self.source_file(path)
+        width = VARIANTS[variant]
+        digest = await self._digest(source)
+        name = f"{digest}-{width}-q{self.quality}"
+        relative = f"{digest[:2]}/{name}.webp"
+        target = os.path.join(self.cache_dir, digest[:2], f"{name}.webp")
+        try:
+            file = open(target, "rb")
+            self.hits += 1
+            if time.time() - os.fstat(file.fileno()).st_mtime > TOUCH_INTERVAL:
+                os.utime(target)
+        except FileNotFoundError:
+            await self._flights.do(name, lambda: self._render(source, target, width))
+            file = open(target, "rb")
+        return file, f'"{name}"', relative
+
+    async def _render(self, source: str, target: str, width: int) -> None:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            size = await loop.run_in_executor(
+                self.start(), render_variant, source, target, width, self.quality, self.max_pixels
+            )
+        except Exception as exc:
+            self.failures += 1
+            logger.warning("Could not resize %s to %dpx: %s", source, width, exc)
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Image could not be resized",
+            ) from exc
+        self.rendered += 1
+        self.render_seconds += time.perf_counter() - started
+
+        if self._cached_bytes is None:
+            self._cached_bytes = await asyncio.to_thread(self._scan_bytes)
+        else:
+            self._cached_bytes += size
+        if self._cached_bytes > self.max_bytes and not self._evicting:
+            self._evicting = True
+            try:
+                self._cached_bytes = await asyncio.to_thread(self._evict, target)
+            finally:
+                self._evicting = False
+
+    def _cache_files(self):
+        for bucket in os.scandir(self.cache_dir):
+            if bucket.is_dir():
+                for entry in os.scandir(bucket.path):
+                    if entry.name.endswith(".webp"):
+                        yield entry
+
+    def _scan_bytes(self) -> int:
+        return sum(entry.stat().st_size for entry in self._cache_files())
+
+    def _evict(self, keep: str) -> int:
+        """Delete least recently used files until the cache is under EVICT_TO of
+        its limit, sparing ``keep``, which a request is about to open."""
+        files = []
+        for entry in self._cache_files():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another worker got to it first
+                pass
+            total -= size
+            self.evicted += 1
+        return total
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "hits": self.hits,
+            "rendered": self.rendered,
+            "failures": self.failures,
+            "evicted": self.evicted,
+            "render_seconds": round(self.render_seconds, 3),
+            "cached_bytes": self._cached_bytes if self._cached_bytes is not None else -1,
+        }
+
+
+image_variants = ImageVariants(
+    source_dir=settings.image_source_dir,
+    cache_dir=settings.image_cache_dir,
+    max_bytes=settings.image_cache_max_bytes,
+    workers=settings.image_workers,
+    quality=settings.image_webp_quality,
+    max_pixels=settings.image_max_pixels,
+    render_timeout=settings.image_render_timeout,
+)
+
+
+class SendfileResponse(Response):
+    """Sends an already open file, closing it afterwards.
+
+    Servers that offer the ASGI ``http.response.zerocopysend`` extension
+    are handed the file itself so the kernel copies it (sendfile(2));
+    others get it in chunks read off the event loop.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, file: BinaryIO, media_type: str, headers: Dict[str, str]):
+        self.file = file
+        self.size = os.fstat(file.fileno()).st_size
+        self.status_code = 200
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+        self.headers["content-length"] = str(self.size)
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": self.file, "count": self.size,
+                            "more_body": False})
+                return
+            more_body = True
+            while more_body:
+                chunk = await anyio.to_thread.run_sync(self.file.read, self.chunk_size)
+                more_body = len(chunk) == self.chunk_size
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        finally:
+            self.file.close()
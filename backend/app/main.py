@@ -1,24 +1,92 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from starlette.background import BackgroundTask
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from typing import List
+from typing import List, Literal, Optional
 
-from . import models, schemas, auth
-from .database import engine, get_db
+from . import models, schemas, auth, bulk, images, metrics
+from .ai_cache import ai_response_cache
+from .ai_history import interaction_log
+from .ai_gateway import agent_gateway, cancel_on_disconnect, sse_event
+from .ai_jobs import TERMINAL, ai_jobs
+from .bundles import PAGE_BUNDLES, ProductSlice
+from .database import dialect_name, get_async_db, get_async_engine, read_db, read_session, recent_writes, replicas
 from .config import settings
-from .dependencies import get_current_active_user, get_super_user
+from .dependencies import get_current_active_user, get_optional_user, get_super_user
+from .facets import refresh_category_stats
+from .filters import json_contains, parse_contains
+from .metrics import MetricsMiddleware, timer
+from .pagination import decode_cursor, encode_cursor, keyset_filter, parse_fields, parse_sort, sort_key
+from .ratelimit import RateLimitMiddleware, limit_ai_user, limit_auth, login_failed, rate_limiter
+from .compression import encoded_etag, json_response, response_compressor, vary_on_encoding
+from .response_cache import CachedResponse, cached_json_response, etag_matches, render_json, response_cache
+from .search import inverted_index, ranked_search_query, search_terms
+from .serialization import CONTENT_FIELDS, IMAGE_FIELDS, PRODUCT_FIELDS, project, render_rows
+from .singleflight import read_flights, request_key
+from .token_cache import UserSnapshot, token_cache
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+# The schema is managed by Alembic (alembic upgrade head). Importing the app
+# runs no DDL and builds no engine; the lifespan below creates the async
+# engine in each worker
+
+async def warm_up_database(connections: int) -> None:
+    """Open pool connections before the first request instead of during it."""
+    async def ping():
+        async with get_async_engine().connect() as conn:
+            await conn.execute(select(1))
+    try:
+        await asyncio.gather(*(ping() for _ in range(connections)))
+    except Exception as exc:
+        # Not fatal: the pool connects lazily once the database is back
+        logger.warning("Database warm-up failed: %s", exc)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_async_engine()
+    auth.password_hasher.start()
+    agent_gateway.start()
+    if settings.db_warmup_connections:
+        await warm_up_database(settings.db_warmup_connections)
+    await replicas.start()
+    await interaction_log.start()
+    ai_jobs.start(settings.ai_job_workers)
+    yield
+    await ai_jobs.stop(settings.ai_job_shutdown_grace)
+    await interaction_log.close()
+    auth.password_hasher.shutdown()
+    images.image_variants.shutdown()
+    await agent_gateway.close()
+    await replicas.close()
+    await get_async_engine().dispose()
+
+def data_changed(namespace: str) -> None:
+    """After committing a write: drop cached responses, and read the
+    namespace from the primary until replicas have caught up"""
+    response_cache.bump(namespace)
+    recent_writes.note(namespace)
 
 app = FastAPI(
     title="Dracarys API",
     description="AI-powered website backend API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Per-IP limit on every route; auth and AI routes add their own below.
+# Added before CORS so CORS wraps it and its 429s carry CORS headers
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -28,17 +96,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request timing, SQL counts and Server-Timing; outermost so it sees the whole request
+if settings.metrics_enabled:
+    register = metrics.registry.register_stats
+    register("response_cache", response_cache.stats, counters=("hits", "misses"), labels={"versions": "namespace"})
+    register("compression", response_compressor.stats,
+             counters=("compressed", "reused", "skipped", "bytes_in", "bytes_out", "cpu_seconds"),
+             labels={"routes": "route"})
+    register("images", images.image_variants.stats,
+             counters=("hits", "rendered", "failures", "evicted", "render_seconds"))
+    register("password_hasher", auth.password_hasher.snapshot, counters=("rejected", "count"),
+             labels={"operations": "operation"})
+    register("token_cache", token_cache.stats, counters=("hits", "misses", "evictions", "invalidations"))
+    register("ai_cache", ai_response_cache.stats, counters=("exact_hits", "similar_hits", "misses", "evictions"))
+    register("ai_gateway", agent_gateway.stats, counters=("rejected", "timeouts", "errors"))
+    register("ai_jobs", ai_jobs.stats, counters=(
+        "submitted", "deduplicated", "cache_hits", "succeeded", "retried", "deferred", "failed", "reclaimed",
+    ))
+    register("ai_history", interaction_log.stats,
+             counters=("written", "batches", "failures", "rejected", "dropped"))
+    register("singleflight", read_flights.stats, counters=("leaders", "followers", "timeouts"))
+    register("rate_limiter", rate_limiter.stats, counters=("evictions", "errors"))
+    register("replicas", replicas.stats, counters=("replica_reads", "fallbacks", "read_your_writes"))
+    app.add_middleware(
+        MetricsMiddleware,
+        server_timing=settings.server_timing_enabled,
+        n_plus_one_threshold=settings.n_plus_one_query_threshold,
+    )
+
 # Authentication routes
-@app.post("/auth/register", response_model=schemas.Token)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = auth.get_user(db, email=user.email)
+@app.post("/auth/register", response_model=schemas.Token, dependencies=[Depends(limit_auth)])
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await auth.get_user(db, email=user.email)
     if db_user:
         raise HTTPException(
             status_code=400,
             detail="Email already registered"
         )
     
-    user = auth.create_user(db, user)
+    hashed_password = await auth.hash_password(user.password)
+    user = await auth.create_user(db, user, hashed_password)
+    recent_writes.note(f"user:{user.email}")
     access_token = auth.create_access_token(data={"sub": user.email})
     return {
         "access_token": access_token,
@@ -46,10 +144,12 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         "user": user
     }
 
-@app.post("/auth/login", response_model=schemas.Token)
-def login(email: str, password: str, db: Session = Depends(get_db)):
-    user = auth.authenticate_user(db, email, password)
+@app.post("/auth/login", response_model=schemas.Token, dependencies=[Depends(limit_auth)])
+async def login(request: Request, email: str, password: str, db: AsyncSession = Depends(get_async_db)):
+    with timer("auth"):
+        user = await auth.authenticate_user(db, email, password)
     if not user:
+        await login_failed(request, email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -64,113 +164,642 @@ def login(email: str, password: str, db: Session = Depends(get_db)):
     }
 
 @app.get("/auth/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(get_current_active_user)):
-    return current_user
+async def read_users_me(
+    current_user: UserSnapshot = Depends(get_current_active_user)
+):
+    # Keyed by user, so a client sees its own registration or preference change
+    async with read_session(f"user:{current_user.email}") as db:
+        user = await db.get(models.User, current_user.id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+@app.put("/auth/me/preferences", response_model=schemas.User)
+async def update_my_preferences(
+    preferences: schemas.UserPreferences,
+    current_user: UserSnapshot = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user = await db.get(models.User, current_user.id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    for field, value in preferences.dict(exclude_unset=True).items():
+        setattr(user, field, value)
+    
+    await db.commit()
+    recent_writes.note(f"user:{user.email}")
+    await db.refresh(user)
+    return user
 
 # Content management routes
+async def page_content(page: str) -> CachedResponse:
+    """The rendered content of ``page``, from the response cache or loaded once
+    for all concurrent misses."""
+    cached = response_cache.get("content", page)
+    if cached is not None:
+        return cached
+    
+    async def load():
+        # Runs once for all concurrent misses on this page, on its own session
+        version = response_cache.version("content")
+        fast = settings.fast_json_responses
+        columns = project(models.Content, CONTENT_FIELDS) if fast else [models.Content]
+        async with read_session("content") as db:
+            result = await db.execute(
+                select(*columns).where(
+                    models.Content.page == page,
+                    models.Content.is_active == True
+                ).order_by(models.Content.order_index)
+            )
+            rows = result.all() if fast else result.scalars().all()
+        with timer("serialize"):
+            if fast:
+                body = render_rows(rows, CONTENT_FIELDS, IMAGE_FIELDS)
+            else:
+                body = render_json([schemas.Content.model_validate(item) for item in rows])
+        return response_cache.set("content", page, body, version)
+    
+    return await read_flights.do(f"content:{page}", load)
+
 @app.get("/content/{page}", response_model=List[schemas.Content])
-def get_page_content(page: str, db: Session = Depends(get_db)):
-    content = db.query(models.Content).filter(
-        models.Content.page == page,
-        models.Content.is_active == True
-    ).order_by(models.Content.order_index).all()
-    return content
+async def get_page_content(page: str, request: Request):
+    return await cached_json_response(request, await page_content(page))
 
 @app.post("/content", response_model=schemas.Content)
-def create_content(
+async def create_content(
     content: schemas.ContentCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_super_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_super_user)
 ):
     db_content = models.Content(**content.dict())
     db.add(db_content)
-    db.commit()
-    db.refresh(db_content)
+    await db.commit()
+    data_changed("content")
+    await db.refresh(db_content)
     return db_content
 
 @app.put("/content/{content_id}", response_model=schemas.Content)
-def update_content(
+async def update_content(
     content_id: int,
     content_update: schemas.ContentUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_super_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_super_user)
 ):
-    db_content = db.query(models.Content).filter(models.Content.id == content_id).first()
+    db_content = await db.get(models.Content, content_id)
     if not db_content:
         raise HTTPException(status_code=404, detail="Content not found")
     
     for field, value in content_update.dict(exclude_unset=True).items():
         setattr(db_content, field, value)
     
-    db.commit()
-    db.refresh(db_content)
+    await db.commit()
+    data_changed("content")
+    await db.refresh(db_content)
     return db_content
 
+@app.post("/content/bulk", response_model=schemas.BulkImportResult)
+async def bulk_import_content(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_super_user)
+):
+    """Import NDJSON or CSV content rows; rows with an id are upserted."""
+    result = await bulk.import_records(request, db, models.Content, schemas.ContentImport)
+    if result.created or result.upserted:
+        data_changed("content")
+    return result
+
 # Product routes
 @app.get("/products", response_model=List[schemas.Product])
-def get_products(
+async def get_products(
+    request: Request,
     category: str = None,
-    db: Session = Depends(get_db)
+    features_contains: Optional[str] = Query(
+        None, alias="features.contains", description='JSON the features must contain, e.g. ["API Integration"]'
+    ),
+    limit: int = Query(settings.products_page_size, ge=1, le=settings.products_max_page_size),
+    cursor: Optional[str] = None,
+    sort: Literal["id", "-id", "created_at", "-created_at"] = "id",
+    fields: Optional[str] = Query(None, description="Comma-separated subset of Product fields"),
+    paginate: bool = Query(True, description="Set to false to return every product in one response"),
 ):
-    query = db.query(models.Product).filter(models.Product.is_active == True)
+    sort_field, descending = parse_sort(sort)
+    sort_column = getattr(models.Product, sort_field)
+    dialect = dialect_name()
+    selected = parse_fields(fields, PRODUCT_FIELDS)
+    after = None
+    if cursor and paginate:
+        after = decode_cursor(cursor, is_datetime=sort_field == "created_at")
+    
+    fast = settings.fast_json_responses
+    if selected is None and not fast:
+        query = select(models.Product)
+    else:
+        # The cursor needs id and the sort key even if the client didn't ask for them
+        loaded = set(selected or PRODUCT_FIELDS) | {"id", sort_field}
+        query = select(*project(models.Product, [name for name in PRODUCT_FIELDS if name in loaded]))
+    
+    query = query.where(models.Product.is_active == True)
     if category:
-        query = query.filter(models.Product.category == category)
-    return query.all()
+        query = query.where(models.Product.category == category)
+    if features_contains:
+        contained = parse_contains(features_contains)
+        query = query.where(json_contains(models.Product.features, contained, dialect))
+    if after is not None:
+        query = query.where(keyset_filter(sort_column, models.Product.id, *after, descending, dialect))
+    
+    if descending:
+        query = query.order_by(sort_key(sort_column, dialect).desc(), models.Product.id.desc())
+    else:
+        query = query.order_by(sort_key(sort_column, dialect), models.Product.id)
+    
+    if paginate:
+        query = query.limit(limit + 1)
+    
+    # Pages are cached like facets, so repeat reads skip the query and reuse
+    # their compressed copies
+    key = request_key(request)
+    cached = response_cache.get("products", key)
+    if cached is not None:
+        return await cached_json_response(request, cached)
+    
+    async def load():
+        # Runs once for all identical concurrent requests, on its own session
+        version = response_cache.version("products")
+        async with read_session("products") as db:
+            result = await db.execute(query)
+            rows = result.scalars().all() if selected is None and not fast else result.all()
+        
+        headers = {}
+        if paginate and len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(getattr(last, sort_field), last.id)
+            headers["X-Next-Cursor"] = next_cursor
+            headers["Link"] = '<%s>; rel="next"' % request.url.include_query_params(cursor=next_cursor)
+        
+        with timer("serialize"):
+            if fast:
+                body = render_rows(rows, selected or PRODUCT_FIELDS, () if selected else IMAGE_FIELDS)
+            elif selected is None:
+                body = render_json([schemas.Product.model_validate(row) for row in rows])
+            else:
+                # Serialize projected rows with the Product schema so values are
+                # encoded exactly as in full responses
+                body = render_json([
+                    schemas.Product.model_construct(**row._asdict()).model_dump(mode="json", include=set(selected))
+                    for row in rows
+                ])
+        return response_cache.set("products", key, body, version, headers)
+    
+    return await cached_json_response(request, await read_flights.do(key, load))
+
+@app.get("/products/facets", response_model=List[schemas.CategoryFacet])
+async def get_product_facets(request: Request):
+    """Per-category counts, price range and mean rating of active products."""
+    cached = response_cache.get("products", "facets")
+    if cached is None:
+        async def load():
+            version = response_cache.version("products")
+            async with read_session("products") as db:
+                result = await db.execute(
+                    select(models.ProductCategoryStats).order_by(models.ProductCategoryStats.category)
+                )
+                facets = result.scalars().all()
+            body = render_json([schemas.CategoryFacet.model_validate(facet) for facet in facets])
+            return response_cache.set("products", "facets", body, version)
+        
+        cached = await read_flights.do("products:facets", load)
+    return await cached_json_response(request, cached)
+
+@app.get("/products/search", response_model=List[schemas.Product])
+async def search_products(
+    request: Request,
+    q: str = Query(..., min_length=settings.search_min_query_length),
+    limit: int = Query(settings.products_page_size, ge=1, le=settings.products_max_page_size),
+    cursor: Optional[str] = None,
+):
+    """Ranked prefix search over name, description and features."""
+    terms = search_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Query has no searchable terms")
+    after = decode_cursor(cursor, is_number=True) if cursor else None
+    
+    async def load():
+        async with read_session("products") as db:
+            if dialect_name() == "postgresql":
+                result = await db.execute(ranked_search_query(terms, after, limit + 1))
+                hits = [(product, rank) for product, rank in result.all()]
+            else:
+                await inverted_index.ensure_current()
+                ranked = inverted_index.search(terms, after, limit + 1)
+                products = {}
+                if ranked:
+                    result = await db.execute(
+                        select(models.Product).where(models.Product.id.in_([pid for pid, _ in ranked]))
+                    )
+                    products = {product.id: product for product in result.scalars()}
+                hits = [(products[pid], rank) for pid, rank in ranked if pid in products]
+        
+        headers = {}
+        if len(hits) > limit:
+            hits = hits[:limit]
+            last, rank = hits[-1]
+            next_cursor = encode_cursor(rank, last.id)
+            headers["X-Next-Cursor"] = next_cursor
+            headers["Link"] = '<%s>; rel="next"' % request.url.include_query_params(cursor=next_cursor)
+        return render_json([schemas.Product.model_validate(product) for product, _ in hits]), headers
+    
+    body, headers = await read_flights.do(request_key(request), load)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.post("/products/bulk", response_model=schemas.BulkImportResult)
+async def bulk_import_products(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_super_user)
+):
+    """Import NDJSON or CSV product rows; rows with an id are upserted."""
+    result = await bulk.import_records(request, db, models.Product, schemas.ProductImport)
+    if result.created or result.upserted:
+        # Upserts may have moved products out of categories, so refresh all of them
+        await refresh_category_stats(db)
+        await db.commit()
+        data_changed("products")
+    return result
+
+@app.get("/products/export")
+async def export_products(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: UserSnapshot = Depends(get_super_user)
+):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        bulk.export_records(models.Product, schemas.Product, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'},
+    )
 
 @app.get("/products/{product_id}", response_model=schemas.Product)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+async def get_product(product_id: int, db: AsyncSession = Depends(read_db("products"))):
+    product = await db.get(models.Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
 @app.post("/products", response_model=schemas.Product)
-def create_product(
+async def create_product(
     product: schemas.ProductCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_super_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_super_user)
 ):
     db_product = models.Product(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await db.flush()
+    await refresh_category_stats(db, [db_product.category])
+    await db.commit()
+    data_changed("products")
+    await db.refresh(db_product)
     return db_product
 
 @app.put("/products/{product_id}", response_model=schemas.Product)
-def update_product(
+async def update_product(
     product_id: int,
     product_update: schemas.ProductUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_super_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_super_user)
 ):
-    db_product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    db_product = await db.get(models.Product, product_id)
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    old_category = db_product.category
     for field, value in product_update.dict(exclude_unset=True).items():
         setattr(db_product, field, value)
     
-    db.commit()
-    db.refresh(db_product)
+    await db.flush()
+    await refresh_category_stats(db, [old_category, db_product.category])
+    await db.commit()
+    data_changed("products")
+    await db.refresh(db_product)
     return db_product
 
+# Image variants: resized WebP copies of content and product images
+@app.get("/images/{variant}/{path:path}", include_in_schema=False)
+async def get_image_variant(
+    variant: str,
+    path: str,
+    request: Request,
+    v: Optional[str] = Query(None, description="Source fingerprint from image_variants/image_srcset"),
+):
+    """``variant`` of a local image_url, made on first request (see app.images)."""
+    source = images.source_path(path)
+    if variant not in images.VARIANTS or source is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    file, etag, relative = await images.image_variants.open(source, variant)
+    # Only a URL naming the current file is safe to cache forever
+    cache_control = images.IMMUTABLE if v is not None and v == images.fingerprint(source) else images.REVALIDATE
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        file.close()
+        return Response(status_code=304, headers=headers)
+    if settings.image_accel_redirect_prefix:
+        # nginx sends the file from its internal location for the cache directory
+        file.close()
+        headers["X-Accel-Redirect"] = settings.image_accel_redirect_prefix.rstrip("/") + "/" + relative
+        return Response(media_type="image/webp", headers=headers)
+    return images.SendfileResponse(file, media_type="image/webp", headers=headers)
+
+# Page bundles: content, products and user for one page in one request
+async def product_slice(products: ProductSlice) -> CachedResponse:
+    key = products.cache_key()
+    cached = response_cache.get("products", key)
+    if cached is not None:
+        return cached
+    
+    async def load():
+        version = response_cache.version("products")
+        fast = settings.fast_json_responses
+        columns = project(models.Product, PRODUCT_FIELDS) if fast else [models.Product]
+        query = select(*columns).where(models.Product.is_active == True)
+        if products.category:
+            query = query.where(models.Product.category == products.category)
+        query = query.order_by(models.Product.id).limit(products.limit)
+        async with read_session("products") as db:
+            result = await db.execute(query)
+            rows = result.all() if fast else result.scalars().all()
+        with timer("serialize"):
+            if fast:
+                body = render_rows(rows, PRODUCT_FIELDS, IMAGE_FIELDS)
+            else:
+                body = render_json([schemas.Product.model_validate(row) for row in rows])
+        return response_cache.set("products", key, body, version)
+    
+    return await read_flights.do(f"products:{key}", load)
+
+async def user_json(current_user: UserSnapshot) -> bytes:
+    async with read_session(f"user:{current_user.email}") as db:
+        user = await db.get(models.User, current_user.id)
+    return render_json(schemas.User.model_validate(user)) if user is not None else b"null"
+
+async def skipped() -> None:
+    return None
+
+@app.get("/pages/{page}/bundle", response_model=schemas.PageBundle)
+async def get_page_bundle(
+    page: str,
+    request: Request,
+    category: Optional[str] = Query(None, description="Product category, for pages that include products"),
+    current_user: Optional[UserSnapshot] = Depends(get_optional_user)
+):
+    """Everything a page needs (see app.bundles.PAGE_BUNDLES) in one response.
+    The parts load concurrently, each on its own session; content and
+    products come from the response cache, so anonymous bundles are
+    assembled from cached bodies and revalidate with ETag."""
+    bundle = PAGE_BUNDLES.get(page)
+    if bundle is None:
+        raise HTTPException(status_code=404, detail="Page not found")
+    products = bundle.products
+    if products is not None and category:
+        products = replace(products, category=category)
+    
+    content, product_entry, user_body = await asyncio.gather(
+        page_content(page) if bundle.content else skipped(),
+        product_slice(products) if products is not None else skipped(),
+        user_json(current_user) if bundle.user and current_user is not None else skipped(),
+    )
+    
+    # Derived from the parts' ETags, so a 304 needs no new body
+    tag_source = "|".join([
+        content.etag if content else "-",
+        product_entry.etag if product_entry else "-",
+        hashlib.sha256(user_body).hexdigest() if user_body else "-",
+    ])
+    tag = '"%s"' % hashlib.sha256(tag_source.encode()).hexdigest()[:32]
+    
+    # Anonymous bundles are the same for everyone, so the assembled body and
+    # its compressed variants are kept under the tag; it changes with any part
+    entry = response_cache.get("bundles", tag) if not user_body else None
+    if entry is not None:
+        body = entry.body
+    else:
+        body = b"".join([
+            b'{"page":', render_json(page),
+            b',"content":', content.body if content else b"null",
+            b',"products":', product_entry.body if product_entry else b"null",
+            b',"user":', user_body or b"null",
+            b"}",
+        ])
+        if not user_body:
+            entry = response_cache.set("bundles", tag, body, response_cache.version("bundles"))
+    
+    encoding = response_compressor.choose(request, len(body))
+    etag = encoded_etag(tag, encoding)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache" if user_body else "no-cache",
+        "Vary": "Authorization",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=vary_on_encoding(headers))
+    return await json_response(request, body, headers, encoding, entry.variants if entry else None)
+
 # AI integration endpoint
 @app.post("/ai/process")
-def process_ai_input(
+async def process_ai_input(
     input_text: str,
-    current_user: models.User = Depends(get_current_active_user)
+    request: Request,
+    response: Response,
+    stream: bool = Query(False, description="Stream tokens back as server-sent events"),
+    current_user: UserSnapshot = Depends(limit_ai_user)
 ):
-    # This is where you would integrate with your AI agent
-    # For now, we'll just echo back the input
+    use_cache = settings.ai_cache_enabled and not current_user.ai_cache_opt_out
+    cache_scope = "" if settings.ai_cache_shared else str(current_user.id)
+    
+    cached = ai_response_cache.lookup(input_text, cache_scope) if use_cache else None
+    if cached is not None:
+        response_text, match = cached
+        interaction_log.record(current_user.id, "stream" if stream else "process", input_text, response_text, match)
+        if stream:
+            events = [
+                sse_event({"token": response_text}),
+                sse_event({"input": input_text, "response": response_text, "user_id": current_user.id}, event="done"),
+            ]
+            return StreamingResponse(
+                iter(events),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-AI-Cache": match}
+            )
+        response.headers["X-AI-Cache"] = match
+        return {
+            "input": input_text,
+            "response": response_text,
+            "user_id": current_user.id
+        }
+    
+    slot = await agent_gateway.acquire(current_user.id)
+    
+    if stream:
+        async def events():
+            tokens = []
+            try:
+                async for token in agent_gateway.stream(input_text, current_user.id):
+                    tokens.append(token)
+                    yield sse_event({"token": token})
+                if use_cache:
+                    ai_response_cache.store(input_text, "".join(tokens), cache_scope)
+                interaction_log.record(
+                    current_user.id, "stream", input_text, "".join(tokens), "miss" if use_cache else "bypass"
+                )
+                yield sse_event({
+                    "input": input_text,
+                    "response": "".join(tokens),
+                    "user_id": current_user.id
+                }, event="done")
+            except HTTPException as exc:
+                # Headers are already sent, so failures are reported in-band
+                yield sse_event({"status_code": exc.status_code, "detail": exc.detail}, event="error")
+            finally:
+                slot.release()
+        
+        # Starlette cancels the generator (and the upstream call) when the
+        # client disconnects; the background task covers a generator that
+        # never got to start
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-AI-Cache": "miss"},
+            background=BackgroundTask(slot.release)
+        )
+    
+    try:
+        finished, response_text = await cancel_on_disconnect(
+            request, agent_gateway.complete(input_text, current_user.id)
+        )
+    finally:
+        slot.release()
+    if not finished:
+        # Client closed the connection; nobody is left to read a response
+        return Response(status_code=499)
+    
+    if use_cache:
+        ai_response_cache.store(input_text, response_text, cache_scope)
+    response.headers["X-AI-Cache"] = "miss" if use_cache else "bypass"
+    interaction_log.record(current_user.id, "process", input_text, response_text, response.headers["X-AI-Cache"])
     return {
         "input": input_text,
-        "response": f"AI processed: {input_text}",
+        "response": response_text,
         "user_id": current_user.id
     }
 
+@app.post("/ai/jobs", response_model=schemas.AIJob, status_code=status.HTTP_202_ACCEPTED)
+async def submit_ai_job(
+    input_text: str,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(limit_ai_user)
+):
+    """Queue the input for the AI job workers and return at once; poll
+    GET /ai/jobs/{id} or follow /ai/jobs/{id}/events for the result."""
+    job, created = await ai_jobs.submit(db, current_user, input_text, idempotency_key)
+    if not created or job.status in TERMINAL:
+        response.status_code = status.HTTP_200_OK
+    response.headers["Location"] = f"/ai/jobs/{job.id}"
+    return job
+
+async def get_own_job(job_id: int, current_user: UserSnapshot) -> models.AIJob:
+    job = await ai_jobs.get(job_id)
+    if job is None or (job.user_id != current_user.id and current_user.role != models.UserRole.SUPER_USER):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/ai/jobs/{job_id}", response_model=schemas.AIJob)
+async def get_ai_job(job_id: int, current_user: UserSnapshot = Depends(get_current_active_user)):
+    return await get_own_job(job_id, current_user)
+
+@app.get("/ai/jobs/{job_id}/events")
+async def stream_ai_job(job_id: int, current_user: UserSnapshot = Depends(get_current_active_user)):
+    """Server-sent events: ``status`` on every state change, unnamed
+    ``{"token"}`` events as output arrives, then ``done`` or ``error``.
+    A ``reset`` event means a retry started over and earlier tokens are void."""
+    job = await get_own_job(job_id, current_user)
+    
+    async def events():
+        sent = ""
+        current = job
+        last_status = None
+        while True:
+            if (current.status, current.attempts) != last_status:
+                last_status = (current.status, current.attempts)
+                yield sse_event({"status": current.status.value, "attempts": current.attempts}, event="status")
+            text = current.response or ""
+            if not text.startswith(sent):
+                sent = ""
+                yield sse_event({"attempts": current.attempts}, event="reset")
+            if len(text) > len(sent):
+                yield sse_event({"token": text[len(sent):]})
+                sent = text
+            if current.status in TERMINAL:
+                payload = schemas.AIJob.model_validate(current).model_dump(mode="json")
+                yield sse_event(payload, event="done" if current.status == models.AIJobStatus.SUCCEEDED else "error")
+                return
+            await ai_jobs.wait_for_progress(job_id, settings.ai_job_poll_interval)
+            current = await ai_jobs.get(job_id)
+            if current is None:
+                yield sse_event({"status_code": 404, "detail": "Job not found"}, event="error")
+                return
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/ai/history", response_model=List[schemas.AIInteraction])
+async def get_ai_history(
+    request: Request,
+    limit: int = Query(settings.ai_history_page_size, ge=1, le=settings.ai_history_max_page_size),
+    cursor: Optional[str] = None,
+    current_user: UserSnapshot = Depends(get_current_active_user)
+):
+    """The caller's AI interactions, newest first. New ones show up once
+    the history buffer flushes (AI_HISTORY_FLUSH_INTERVAL)."""
+    interaction = models.AIInteraction
+    query = select(interaction).where(interaction.user_id == current_user.id)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor, is_datetime=True)
+        query = query.where(
+            keyset_filter(interaction.created_at, interaction.id, created_at, row_id, True),
+            # Redundant, but lets PostgreSQL skip partitions newer than the cursor
+            interaction.created_at <= created_at,
+        )
+    query = query.order_by(interaction.created_at.desc(), interaction.id.desc()).limit(limit + 1)
+    
+    async with read_session() as db:
+        rows = (await db.execute(query)).scalars().all()
+    
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = '<%s>; rel="next"' % request.url.include_query_params(cursor=next_cursor)
+    body = render_json([schemas.AIInteraction.model_validate(row) for row in rows])
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Prometheus scrape endpoint (per worker process)
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(content=metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 # Health check
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "healthy", "message": "Dracarys API is running"}
 
 if __name__ == "__main__":
@@ -0,0 +1,359 @@
+import bisect
+import logging
+import threading
+import time
+from collections import Counter as Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.labels, key)} {format_number(value)}" for key, value in values
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: one count per bucket plus +Inf, and the sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(counts), total[0]) for key, (counts, total) in self._series.items())
+        lines = self.header()
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="%s"' % format_number(float(bound))
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {format_number(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+@dataclass
+class StatsSource:
+    source: Callable[[], Dict[str, object]]
+    counters: frozenset
+    labels: Dict[str, str]
+
+
+class Registry:
+    """Metrics for this process, rendered in the Prometheus text format.
+
+    Each worker process keeps its own registry, so scrape every worker (or
+    sum across them) rather than one load-balanced address. ``stats``
+    sources expose the existing ``stats()`` dicts of the caches: keys named
+    in ``counters`` as counters, the other numbers as gauges, and a nested
+    dict named in ``labels`` as one series per entry, labelled with its key
+    (``{"routes": "route"}`` turns ``{"routes": {"/x": {"ratio": 2}}}`` into
+    ``<prefix>_<source>_routes_ratio{route="/x"} 2``).
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._metrics: List[Metric] = []
+        self._stats: Dict[str, StatsSource] = {}
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(f"{self.prefix}_{name}", documentation, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(f"{self.prefix}_{name}", documentation, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, name: str, source: Callable[[], Dict[str, object]],
+                       counters: Sequence[str] = (), labels: Optional[Dict[str, str]] = None) -> None:
+        self._stats[name] = StatsSource(source, frozenset(counters), labels or {})
+
+    def render_stats(self, source_name: str, stats: StatsSource) -> List[str]:
+        samples: Dict[str, List[str]] = {}
+        types: Dict[str, str] = {}
+
+        def add(key: str, metric: str, labels: str, value: object) -> None:
+            # Strings, lists and missing values (None) are not samples
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return
+            name = f"{self.prefix}_{source_name}_{key}"
+            types[name] = "counter" if metric in stats.counters else "gauge"
+            samples.setdefault(name, []).append(f"{name}{labels} {format_number(value)}")
+
+        for key, value in stats.source().items():
+            if not isinstance(value, dict):
+                add(key, key, "", value)
+                continue
+            label = stats.labels.get(key)
+            if label is None:
+                continue
+            for label_value, inner in value.items():
+                labels = format_labels((label,), (label_value,))
+                if isinstance(inner, dict):
+                    for metric, metric_value in inner.items():
+                        add(f"{key}_{metric}", metric, labels, metric_value)
+                else:
+                    add(key, key, labels, inner)
+
+        lines: List[str] = []
+        for name, series in samples.items():
+            lines.append(f"# TYPE {name} {types[name]}")
+            lines.extend(series)
+        return lines
+
+    def render(self) -> bytes:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for source_name, stats in self._stats.items():
+            lines.extend(self.render_stats(source_name, stats))
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+registry = Registry("dracarys")
+request_duration = registry.histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte", ("method", "route"),
+)
+requests_total = registry.counter("http_requests_total", "Requests by route and status", ("method", "route", "status"))
+request_queries = registry.histogram(
+    "http_request_db_queries", "SQL statements executed per request", ("route",), QUERY_BUCKETS,
+)
+request_db_time = registry.histogram("http_request_db_seconds", "Time spent executing SQL per request", ("route",))
+response_size = registry.histogram("http_response_size_bytes", "Response body size", ("route",), SIZE_BUCKETS)
+n_plus_one = registry.counter(
+    "http_request_n_plus_one_total", "Requests that exceeded N_PLUS_ONE_QUERY_THRESHOLD statements", ("route",),
+)
+pool_wait = registry.histogram("db_pool_checkout_seconds", "Time waiting to check a connection out of the pool", ("pool",))
+phase_time = registry.histogram("http_request_phase_seconds", "Time spent in named request phases", ("route", "phase"))
+
+
+@dataclass
+class RequestStats:
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    db_seconds: float = 0.0
+    pool_seconds: float = 0.0
+    phases: Dict[str, float] = field(default_factory=dict)
+    statements: Tally = field(default_factory=Tally)
+
+    def server_timing(self) -> str:
+        total = (time.perf_counter() - self.started) * 1000
+        parts = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"']
+        if self.pool_seconds:
+            parts.append(f"pool;dur={self.pool_seconds * 1000:.1f}")
+        parts.extend(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.phases.items())
+        parts.append(f"total;dur={total:.1f}")
+        return ", ".join(parts)
+
+
+# Set by the middleware for each request; engine and pool hooks add to it.
+# SQLAlchemy's async engine runs these hooks in the caller's context.
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+@contextmanager
+def timer(phase: str):
+    """Attribute the enclosed block to ``phase`` in Server-Timing and the phase histogram."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = current_request.get()
+        if stats is not None:
+            stats.phases[phase] = stats.phases.get(phase, 0.0) + time.perf_counter() - started
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        stats.statements[statement] += 1
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Count and time every statement ``engine`` runs against the current request.
+
+    Pass ``async_engine.sync_engine`` for the async engine.
+    """
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class TimedPoolMixin:
+    """Records how long each checkout waits for a free (or new) connection."""
+
+    pool_label = "sync"
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            elapsed = time.perf_counter() - started
+            pool_wait.observe(elapsed, self.pool_label)
+            stats = current_request.get()
+            if stats is not None:
+                stats.pool_seconds += elapsed
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pool_label = "sync"
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pool_label = "async"
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """Times each HTTP request and publishes its DB and phase breakdown.
+
+    A plain ASGI middleware rather than BaseHTTPMiddleware, so streaming
+    responses pass through untouched and the request context (which the
+    engine hooks write to) is the handler's own.
+    """
+
+    def __init__(self, app, server_timing: bool = True, n_plus_one_threshold: int = 0):
+        self.app = app
+        self.server_timing = server_timing
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    # Streaming bodies are timed up to their first byte here
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (b"server-timing", stats.server_timing().encode("latin-1"))
+                    ]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            self.record(scope, stats, status_code, size)
+
+    def record(self, scope, stats: RequestStats, status_code: int, size: int) -> None:
+        route = route_label(scope)
+        method = scope["method"]
+        request_duration.observe(time.perf_counter() - stats.started, method, route)
+        requests_total.inc(method, route, str(status_code))
+        request_queries.observe(stats.queries, route)
+        request_db_time.observe(stats.db_seconds, route)
+        response_size.observe(size, route)
+        for phase, seconds in stats.phases.items():
+            phase_time.observe(seconds, route, phase)
+
+        if self.n_plus_one_threshold and stats.queries > self.n_plus_one_threshold:
+            n_plus_one.inc(route)
+            statement, repeats = stats.statements.most_common(1)[0]
+            logger.warning(
+                "%s %s ran %d queries (threshold %d); most repeated (%dx): %s",
+                method, route, stats.queries, self.n_plus_one_threshold, repeats, " ".join(statement.split())[:200],
+            )
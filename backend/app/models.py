@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, DateTime, Float, Text, Enum, ForeignKey, Index, JSON, UniqueConstraint, false, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from .database import Base
 import enum
@@ -7,6 +8,12 @@ class UserRole(str, enum.Enum):
     SUPER_USER = "super_user"
     CLIENT = "client"
 
+class AIJobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
 class User(Base):
     __tablename__ = "users"
 
@@ -16,9 +23,15 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     role = Column(Enum(UserRole), default=UserRole.CLIENT)
     is_active = Column(Boolean, default=True)
+    ai_cache_opt_out = Column(Boolean, default=False, server_default=false(), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # auth.get_user matches emails case-insensitively
+        Index("ix_users_email_lower", func.lower(email)),
+    )
+
 class Content(Base):
     __tablename__ = "content"
 
@@ -33,6 +46,14 @@ class Content(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # get_page_content: WHERE page = ? AND is_active ORDER BY order_index
+        Index(
+            "ix_content_page_order_active", "page", "order_index",
+            postgresql_where=text("is_active"), sqlite_where=text("is_active = 1")
+        ),
+    )
+
 class Product(Base):
     __tablename__ = "products"
 
@@ -42,9 +63,103 @@ class Product(Base):
     price = Column(Integer)  # in cents
     category = Column(String, nullable=False)
     image_url = Column(String)
-    features = Column(Text)  # JSON string
+    features = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"))
     rating = Column(Integer, default=0)
     reviews_count = Column(Integer, default=0)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now()) 
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # get_products: WHERE is_active [AND category = ?]
+        Index(
+            "ix_products_category_active", "category",
+            postgresql_where=text("is_active"), sqlite_where=text("is_active = 1")
+        ),
+        # Keyset pagination for sort=created_at / sort=-created_at
+        Index(
+            "ix_products_created_at_id_active", "created_at", "id",
+            postgresql_where=text("is_active"), sqlite_where=text("is_active = 1")
+        ),
+        # features.contains filter (jsonb @>); PostgreSQL only
+        Index(
+            "ix_products_features_active", "features",
+            postgresql_using="gin", postgresql_ops={"features": "jsonb_path_ops"},
+            postgresql_where=text("is_active"),
+        ).ddl_if(dialect="postgresql"),
+    )
+
+class ProductCategoryStats(Base):
+    """Per-category aggregates over active products, refreshed on product writes"""
+    __tablename__ = "product_category_stats"
+
+    category = Column(String, primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)
+    min_price = Column(Integer)
+    max_price = Column(Integer)
+    avg_rating = Column(Float)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class AIJob(Base):
+    """An /ai/jobs request: the queue the AI job workers claim from and the
+    record clients poll"""
+    __tablename__ = "ai_jobs"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    idempotency_key = Column(String)
+    input_text = Column(Text, nullable=False)
+    status = Column(Enum(AIJobStatus), nullable=False, default=AIJobStatus.QUEUED)
+    priority = Column(Integer, nullable=False, default=0)  # lower runs first
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    # Epoch seconds: when the job may next be claimed, and when a claim
+    # expires if its worker stops reporting progress
+    run_at = Column(Float, nullable=False)
+    lease_expires_at = Column(Float)
+    # AI response cache scope for the result; NULL = don't cache
+    cache_scope = Column(String)
+    response = Column(Text)  # partial while running
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # Submitting the same key twice returns the first job
+        UniqueConstraint("user_id", "idempotency_key", name="uq_ai_jobs_user_idempotency_key"),
+        # Workers claim the first queued job by priority, then due time
+        Index(
+            "ix_ai_jobs_queued", "priority", "run_at", "id",
+            postgresql_where=text("status = 'QUEUED'"), sqlite_where=text("status = 'QUEUED'")
+        ),
+        # Expired claims, for the reaper
+        Index(
+            "ix_ai_jobs_running_lease", "lease_expires_at",
+            postgresql_where=text("status = 'RUNNING'"), sqlite_where=text("status = 'RUNNING'")
+        ),
+        # Per-user active job limit
+        Index("ix_ai_jobs_user_status", "user_id", "status"),
+    )
+
+class AIInteraction(Base):
+    """One answered AI request, written in batches by app.ai_history.
+
+    On PostgreSQL the table is range-partitioned by month on created_at
+    (see migration 0008), so its real primary key is (id, created_at).
+    """
+    __tablename__ = "ai_interactions"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    source = Column(String, nullable=False)  # process, stream, job
+    cache = Column(String)  # exact, similar, miss or bypass
+    input_text = Column(Text, nullable=False)
+    response = Column(Text, nullable=False)
+    # Set when the request is answered, not when the batch is written
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        # /ai/history: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_ai_interactions_user_created", "user_id", "created_at", "id"),
+    )
@@ -0,0 +1,78 @@
+import base64
+import binascii
+import json
+import math
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, func, literal, tuple_
+
+
+def encode_cursor(value: Any, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, is_datetime: bool = False, is_number: bool = False) -> Tuple[Any, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if is_datetime:
+            value = datetime.fromisoformat(value)
+        if is_number:
+            # bool is an int too, and json.loads accepts NaN and Infinity
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ValueError(value)
+            value = float(value)
+        return value, int(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def sort_key(column, dialect: Optional[str] = None):
+    """``column`` as pages are ordered and compared on it.
+
+    SQLite keeps datetimes as text, and server_default=func.now() writes
+    them without the microseconds that a bound Python datetime carries, so
+    the cursor's value never equals its own row. strftime puts both sides
+    in one format there; other backends compare the column itself.
+    """
+    if dialect == "sqlite" and isinstance(column.type, DateTime):
+        return func.strftime("%Y-%m-%d %H:%M:%f", column)
+    return column
+
+
+def keyset_filter(sort_column, id_column, value: Any, row_id: int, descending: bool,
+                  dialect: Optional[str] = None):
+    """Rows strictly after (value, row_id) in (sort_column, id_column) order.
+
+    Order the query by ``sort_key(sort_column, dialect)`` to match.
+    """
+    if sort_column is id_column:
+        return id_column < row_id if descending else id_column > row_id
+    # Row-value comparison lets the planner use a (sort_column, id) index range
+    key = tuple_(sort_key(sort_column, dialect), id_column)
+    boundary = tuple_(sort_key(literal(value, sort_column.type), dialect), row_id)
+    return key < boundary if descending else key > boundary
+
+
+def parse_sort(sort: str) -> Tuple[str, bool]:
+    descending = sort.startswith("-")
+    return sort.lstrip("-"), descending
+
+
+def parse_fields(fields: Optional[str], allowed: Tuple[str, ...]) -> Optional[Tuple[str, ...]]:
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    # Keep the schema's field order so projected rows read like full ones
+    return tuple(name for name in allowed if name in requested)
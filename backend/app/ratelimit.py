@@ -0,0 +1,281 @@
+"""Token-bucket rate limiting for abuse-prone routes.
+
+Limits are written ``"<count>/<second|minute|hour>"``: a bucket holds up
+to ``count`` tokens (the burst) and refills at ``count`` per period. Every
+route class has its own buckets, keyed by client IP, user id or account:
+
+- ``default``: every request per IP, checked in middleware before routing;
+- ``auth``: /auth/login and /auth/register per IP, and failed logins per
+  account and IP (so nobody can lock an account out from elsewhere);
+- ``ai``: /ai/process per IP before auth and per user after it.
+
+Checks never touch the database. The in-memory store is per process; set
+RATE_LIMIT_BACKEND=redis to share buckets between workers.
+"""
+
+import math
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from starlette.responses import JSONResponse
+
+from .config import settings
+from .dependencies import get_current_active_user
+from .metrics import registry
+from .token_cache import UserSnapshot
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+rejections = registry.counter("rate_limited_total", "Requests rejected by the rate limiter", ("route_class", "scope"))
+
+
+class Limit(NamedTuple):
+    capacity: float
+    refill_per_second: float
+
+    @classmethod
+    def parse(cls, spec: str) -> "Limit":
+        count, _, period = spec.partition("/")
+        seconds = PERIODS.get(period.strip().rstrip("s"))
+        if seconds is None or not count.strip().isdigit() or int(count) <= 0:
+            raise ValueError(f"Invalid rate limit {spec!r}, expected e.g. '10/minute'")
+        return cls(float(count), int(count) / seconds)
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: float
+    retry_after: float
+
+
+def take(tokens: float, updated: float, now: float, limit: Limit, cost: float) -> Tuple[Decision, float]:
+    """Refill a bucket to ``now`` and try to take ``cost`` tokens from it."""
+    tokens = min(limit.capacity, tokens + (now - updated) * limit.refill_per_second)
+    if tokens >= cost:
+        return Decision(True, tokens - cost, 0.0), tokens - cost
+    return Decision(False, tokens, (cost - tokens) / limit.refill_per_second), tokens
+
+
+class MemoryStore:
+    """Buckets for this process, split across independently locked shards.
+
+    Each shard is an LRU capped at ``max_keys / shards`` entries; evicting
+    an idle bucket only forgets tokens it would have refilled anyway.
+    """
+
+    def __init__(self, shards: int, max_keys: int):
+        self.max_keys_per_shard = max(1, max_keys // shards)
+        self.evictions = 0
+        self._shards: List[Tuple["OrderedDict[str, Tuple[float, float]]", threading.Lock]] = [
+            (OrderedDict(), threading.Lock()) for _ in range(shards)
+        ]
+
+    def check(self, key: str, limit: Limit, cost: float = 1.0) -> Decision:
+        buckets, lock = self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+        now = time.monotonic()
+        with lock:
+            tokens, updated = buckets.get(key, (limit.capacity, now))
+            decision, tokens = take(tokens, updated, now, limit, cost)
+            buckets[key] = (tokens, now)
+            buckets.move_to_end(key)
+            if len(buckets) > self.max_keys_per_shard:
+                buckets.popitem(last=False)
+                self.evictions += 1
+        return decision
+
+    async def hit(self, key: str, limit: Limit, cost: float = 1.0) -> Decision:
+        return self.check(key, limit, cost)
+
+    def stats(self) -> Dict[str, int]:
+        return {"keys": sum(len(buckets) for buckets, _ in self._shards), "evictions": self.evictions}
+
+
+# Refill and take in one round trip; Redis' own clock keeps workers consistent
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisStore:
+    """Buckets shared by every worker through Redis (needs the ``redis`` package).
+
+    If Redis is unreachable requests are let through, so an outage of the
+    limiter does not become an outage of the API.
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:", client=None):
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as exc:
+                raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the redis package (pip install redis)") from exc
+            client = redis.from_url(url)
+        self.prefix = prefix
+        self.errors = 0
+        self._client = client
+        self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def hit(self, key: str, limit: Limit, cost: float = 1.0) -> Decision:
+        try:
+            allowed, tokens = await self._script(
+                keys=[self.prefix + key], args=[limit.capacity, limit.refill_per_second, cost]
+            )
+        except Exception:
+            self.errors += 1
+            return Decision(True, 0.0, 0.0)
+        tokens = float(tokens)
+        if allowed:
+            return Decision(True, tokens, 0.0)
+        return Decision(False, tokens, (cost - tokens) / limit.refill_per_second)
+
+    def stats(self) -> Dict[str, int]:
+        return {"errors": self.errors}
+
+
+def client_ip(scope) -> str:
+    if settings.rate_limit_trust_forwarded_for:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimiter:
+    def __init__(self, store, limits: Dict[Tuple[str, str], Limit], enabled: bool = True):
+        self.store = store
+        self.limits = limits
+        self.enabled = enabled
+
+    async def check(self, route_class: str, scope: str, identity: str, cost: float = 1.0) -> Optional[Decision]:
+        """The rejecting decision for ``identity``, or None if the request may proceed.
+
+        With ``cost=0`` the bucket is only looked at: the request is refused
+        once it holds less than one token (see ``charge``).
+        """
+        limit = self.limits.get((route_class, scope))
+        if not self.enabled or limit is None:
+            return None
+        decision = await self.store.hit(f"{route_class}:{scope}:{identity}", limit, cost)
+        if decision.allowed and decision.remaining + cost >= 1:
+            return None
+        rejections.inc(route_class, scope)
+        retry_after = max(decision.retry_after, (1 - cost - decision.remaining) / limit.refill_per_second)
+        return Decision(False, decision.remaining, retry_after)
+
+    async def charge(self, route_class: str, scope: str, identity: str) -> None:
+        """Take a token for something that already happened, such as a failed login."""
+        limit = self.limits.get((route_class, scope))
+        if self.enabled and limit is not None:
+            await self.store.hit(f"{route_class}:{scope}:{identity}", limit)
+
+    async def enforce(self, route_class: str, scope: str, identity: str, cost: float = 1.0) -> None:
+        decision = await self.check(route_class, scope, identity, cost)
+        if decision is not None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please retry later",
+                headers={"Retry-After": str(math.ceil(decision.retry_after))},
+            )
+
+    def stats(self) -> Dict[str, int]:
+        return self.store.stats()
+
+
+def create_store():
+    if settings.rate_limit_backend == "redis":
+        if not settings.rate_limit_redis_url:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs RATE_LIMIT_REDIS_URL")
+        return RedisStore(settings.rate_limit_redis_url)
+    return MemoryStore(shards=settings.rate_limit_shards, max_keys=settings.rate_limit_max_keys)
+
+
+rate_limiter = RateLimiter(
+    store=create_store(),
+    limits={
+        ("default", "ip"): Limit.parse(settings.rate_limit_default_ip),
+        ("auth", "ip"): Limit.parse(settings.rate_limit_auth_ip),
+        ("auth", "account"): Limit.parse(settings.rate_limit_auth_account),
+        ("ai", "ip"): Limit.parse(settings.rate_limit_ai_ip),
+        ("ai", "user"): Limit.parse(settings.rate_limit_ai_user),
+    },
+    enabled=settings.rate_limit_enabled,
+)
+
+
+class RateLimitMiddleware:
+    """Applies the ``default`` per-IP limit before routing, so a rejection
+    costs one bucket update and a canned response."""
+
+    def __init__(self, app, limiter: RateLimiter, exempt: Tuple[str, ...] = ("/health", "/metrics")):
+        self.app = app
+        self.limiter = limiter
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        # Preflights carry no credentials and CORSMiddleware answers them
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in self.exempt:
+            await self.app(scope, receive, send)
+            return
+        decision = await self.limiter.check("default", "ip", client_ip(scope))
+        if decision is None:
+            await self.app(scope, receive, send)
+            return
+        response = JSONResponse(
+            {"detail": "Too many requests, please retry later"},
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(math.ceil(decision.retry_after))},
+        )
+        await response(scope, receive, send)
+
+
+def account_key(request: Request, email: str) -> str:
+    return f"{email.strip().lower()}|{client_ip(request.scope)}"
+
+
+async def limit_auth(request: Request) -> None:
+    """Per-IP limit on the auth routes. A login is also refused while this
+    IP's failed attempts on the account have used up its bucket."""
+    await rate_limiter.enforce("auth", "ip", client_ip(request.scope))
+    email = request.query_params.get("email")
+    if email:
+        await rate_limiter.enforce("auth", "account", account_key(request, email), cost=0)
+
+
+async def login_failed(request: Request, email: str) -> None:
+    """Counts a failed login against the (account, IP) bucket limit_auth checks."""
+    await rate_limiter.charge("auth", "account", account_key(request, email))
+
+
+async def limit_ai_ip(request: Request) -> None:
+    await rate_limiter.enforce("ai", "ip", client_ip(request.scope))
+
+
+async def limit_ai_user(
+    _ip: None = Depends(limit_ai_ip),
+    current_user: UserSnapshot = Depends(get_current_active_user),
+) -> UserSnapshot:
+    """Stands in for get_current_active_user on /ai/process; the per-IP
+    check runs before the token is looked at."""
+    await rate_limiter.enforce("ai", "user", str(current_user.id))
+    return current_user
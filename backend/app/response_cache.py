@@ -0,0 +1,138 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from .compression import encoded_etag, json_response, response_compressor, vary_on_encoding
+from .config import settings
+from .shared_counters import shared_counters
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    version: int
+    stored_at: float
+    # Extra response headers, e.g. a next-page Link
+    headers: Dict[str, str] = field(default_factory=dict)
+    # Compressed copies of body by Content-Encoding, filled on first use
+    variants: Dict[str, bytes] = field(default_factory=dict, compare=False)
+
+
+def render_json(data: Any) -> bytes:
+    # Same encoding JSONResponse.render uses, so cached bodies match uncached ones
+    return json.dumps(
+        jsonable_encoder(data),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """In-process cache of serialized response bodies.
+
+    Entries are grouped into namespaces ("content", "products", ...). Each
+    namespace has a version counter that write endpoints bump, which makes
+    every entry stored under an older version a miss. Versions live in
+    ``shared_counters``, so preloaded workers see each other's bumps at
+    once; otherwise ``ttl_seconds`` bounds how long another worker's bump
+    can go unnoticed.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._namespaces: Set[str] = set()
+        self._entries: "OrderedDict[Tuple[str, str], CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def version(self, namespace: str) -> int:
+        self._namespaces.add(namespace)
+        return shared_counters.get(f"response_cache:{namespace}")
+
+    def bump(self, namespace: str) -> int:
+        self._namespaces.add(namespace)
+        return shared_counters.increment(f"response_cache:{namespace}")
+
+    def get(self, namespace: str, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and (
+                entry.version != self.version(namespace)
+                or time.monotonic() - entry.stored_at > self.ttl_seconds
+            ):
+                del self._entries[(namespace, key)]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((namespace, key))
+            self.hits += 1
+            return entry
+
+    def set(self, namespace: str, key: str, body: bytes, version: int,
+            headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        """Store ``body`` as computed under ``version``.
+
+        Callers read the version *before* querying, so a write that lands
+        mid-query leaves the entry already stale instead of caching old data.
+        """
+        entry = CachedResponse(
+            body=body,
+            etag='"%s"' % hashlib.sha256(body).hexdigest()[:32],
+            version=version,
+            stored_at=time.monotonic(),
+            headers=headers or {},
+        )
+        if self.max_entries <= 0:
+            return entry
+        with self._lock:
+            self._entries[(namespace, key)] = entry
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "versions": {namespace: self.version(namespace) for namespace in sorted(self._namespaces)},
+        }
+
+
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    ttl_seconds=settings.response_cache_ttl_seconds,
+)
+
+
+async def cached_json_response(request: Request, entry: CachedResponse) -> Response:
+    encoding = response_compressor.choose(request, len(entry.body))
+    etag = encoded_etag(entry.etag, encoding)
+    headers = {**entry.headers, "ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=vary_on_encoding(headers))
+    return await json_response(request, entry.body, headers, encoding, entry.variants)
@@ -1,7 +1,9 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+import json
+from pydantic import BaseModel, BeforeValidator, EmailStr, computed_field
+from typing import Annotated, Any, Dict, Optional, List, Union
 from datetime import datetime
-from .models import UserRole
+from . import images
+from .models import AIJobStatus, UserRole
 
 # User schemas
 class UserBase(BaseModel):
@@ -20,12 +22,16 @@ class User(UserBase):
     id: int
     role: UserRole
     is_active: bool
+    ai_cache_opt_out: bool = False
     created_at: datetime
     updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+class UserPreferences(BaseModel):
+    ai_cache_opt_out: Optional[bool] = None
+
 # Auth schemas
 class Token(BaseModel):
     access_token: str
@@ -35,6 +41,18 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     email: Optional[str] = None
 
+# Resized image URLs, for schemas with an image_url
+class ImageVariants(BaseModel):
+    @computed_field
+    @property
+    def image_variants(self) -> Optional[Dict[str, str]]:
+        return images.variant_urls(self.image_url)
+
+    @computed_field
+    @property
+    def image_srcset(self) -> Optional[str]:
+        return images.srcset(self.image_url)
+
 # Content schemas
 class ContentBase(BaseModel):
     page: str
@@ -54,7 +72,11 @@ class ContentUpdate(BaseModel):
     order_index: Optional[int] = None
     is_active: Optional[bool] = None
 
-class Content(ContentBase):
+class ContentImport(ContentBase):
+    id: Optional[int] = None
+    is_active: bool = True
+
+class Content(ContentBase, ImageVariants):
     id: int
     is_active: bool
     created_at: datetime
@@ -64,13 +86,24 @@ class Content(ContentBase):
         from_attributes = True
 
 # Product schemas
+def parse_features(value: Any) -> Any:
+    # Older clients and CSV imports send features as a JSON-encoded string
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+Features = Annotated[Optional[Union[List[Any], Dict[str, Any], str]], BeforeValidator(parse_features)]
+
 class ProductBase(BaseModel):
     name: str
     description: Optional[str] = None
     price: Optional[int] = None
     category: str
     image_url: Optional[str] = None
-    features: Optional[str] = None
+    features: Features = None
 
 class ProductCreate(ProductBase):
     pass
@@ -81,12 +114,18 @@ class ProductUpdate(BaseModel):
     price: Optional[int] = None
     category: Optional[str] = None
     image_url: Optional[str] = None
-    features: Optional[str] = None
+    features: Features = None
     rating: Optional[int] = None
     reviews_count: Optional[int] = None
     is_active: Optional[bool] = None
 
-class Product(ProductBase):
+class ProductImport(ProductBase):
+    id: Optional[int] = None
+    rating: int = 0
+    reviews_count: int = 0
+    is_active: bool = True
+
+class Product(ProductBase, ImageVariants):
     id: int
     rating: int
     reviews_count: int
@@ -95,4 +134,61 @@ class Product(ProductBase):
     updated_at: Optional[datetime] = None
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class CategoryFacet(BaseModel):
+    category: str
+    product_count: int
+    min_price: Optional[int] = None
+    max_price: Optional[int] = None
+    avg_rating: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+# Page bundle schema (GET /pages/{page}/bundle)
+class PageBundle(BaseModel):
+    page: str
+    content: Optional[List[Content]] = None
+    products: Optional[List[Product]] = None
+    user: Optional[User] = None
+
+# Bulk import schemas
+class BulkRowError(BaseModel):
+    row: int
+    errors: List[str]
+
+class BulkImportResult(BaseModel):
+    received: int
+    created: int
+    upserted: int
+    failed: int
+    errors: List[BulkRowError]
+    errors_truncated: bool = False
+
+# AI job schemas
+class AIJob(BaseModel):
+    id: int
+    status: AIJobStatus
+    priority: int
+    attempts: int
+    input_text: str
+    response: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class AIInteraction(BaseModel):
+    id: int
+    source: str
+    cache: Optional[str] = None
+    input_text: str
+    response: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
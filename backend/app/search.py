@@ -0,0 +1,130 @@
+import asyncio
+import bisect
+import heapq
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, column, func, literal_column, or_, select
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from . import models
+from .database import read_session
+from .response_cache import response_cache
+
+# Letters and digits only, so terms never carry tsquery operators
+_TERM = re.compile(r"[^\W_]+")
+
+# Maintained by a trigger since migration 0005; PostgreSQL only, so it is not on the model
+search_vector = column("search_vector", TSVECTOR)
+# Same text search configuration the column is generated with; a literal
+# keeps the statement compilable with literal_binds for EXPLAIN
+TS_CONFIG = literal_column("'simple'")
+
+# Field weights for the in-memory index, matching ts_rank's defaults for A/B/C
+FIELD_WEIGHTS = (("name", 1.0), ("description", 0.4), ("features", 0.2))
+
+
+def search_terms(q: str) -> List[str]:
+    return _TERM.findall(q.casefold())
+
+
+def prefix_tsquery(terms: List[str]):
+    """Every term matches as a prefix, so "wire mou" finds "wireless mouse"."""
+    return func.to_tsquery(TS_CONFIG, " & ".join(f"{term}:*" for term in terms))
+
+
+def ranked_search_query(terms: List[str], after: Optional[Tuple[float, int]], limit: int):
+    query = prefix_tsquery(terms)
+    rank = func.ts_rank(search_vector, query)
+    statement = (
+        select(models.Product, rank.label("rank"))
+        .where(models.Product.is_active == True, search_vector.op("@@")(query))
+    )
+    if after is not None:
+        # Equivalent to (rank, id) < after; rank is computed so there is no index to range over
+        statement = statement.where(or_(rank < after[0], and_(rank == after[0], models.Product.id < after[1])))
+    return statement.order_by(rank.desc(), models.Product.id.desc()).limit(limit)
+
+
+class InvertedIndex:
+    """Fallback product search for databases without full-text search.
+
+    Postings map each lowercased token to ``{product_id: weight}``; the
+    sorted token list makes prefix matches a bisect plus a short scan.
+    The index is rebuilt from the database whenever the "products"
+    response-cache version moves.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.builds = 0
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._tokens: List[str] = []
+        self._lock = asyncio.Lock()
+
+    async def ensure_current(self) -> None:
+        version = response_cache.version("products")
+        if self.version == version:
+            return
+        async with self._lock:
+            if self.version == version:
+                return
+            async with read_session("products") as db:
+                result = await db.execute(
+                    select(
+                        models.Product.id,
+                        models.Product.name,
+                        models.Product.description,
+                        models.Product.features,
+                    ).where(models.Product.is_active == True)
+                )
+                rows = result.all()
+            self._build(rows)
+            self.version = version
+
+    def _build(self, rows) -> None:
+        postings: Dict[str, Dict[int, float]] = {}
+        for row in rows:
+            for field, weight in FIELD_WEIGHTS:
+                value = getattr(row, field)
+                if not value:
+                    continue
+                if not isinstance(value, str):
+                    value = json.dumps(value, ensure_ascii=False)
+                for token in search_terms(value):
+                    scores = postings.setdefault(token, {})
+                    scores[row.id] = scores.get(row.id, 0.0) + weight
+        self._postings = postings
+        self._tokens = sorted(postings)
+        self.builds += 1
+
+    def _matches(self, term: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        position = bisect.bisect_left(self._tokens, term)
+        while position < len(self._tokens) and self._tokens[position].startswith(term):
+            token = self._tokens[position]
+            position += 1
+            for product_id, weight in self._postings[token].items():
+                scores[product_id] = scores.get(product_id, 0.0) + weight
+        return scores
+
+    def search(self, terms: List[str], after: Optional[Tuple[float, int]], limit: int) -> List[Tuple[int, float]]:
+        """Return up to ``limit`` ``(product_id, rank)`` pairs, best first."""
+        ranked: Optional[Dict[int, float]] = None
+        for term in terms:
+            scores = self._matches(term)
+            if ranked is None:
+                ranked = scores
+            else:
+                ranked = {pid: rank + scores[pid] for pid, rank in ranked.items() if pid in scores}
+            if not ranked:
+                return []
+
+        hits = ((round(rank, 6), pid) for pid, rank in ranked.items())
+        if after is not None:
+            hits = (hit for hit in hits if hit < tuple(after))
+        return [(pid, rank) for rank, pid in heapq.nlargest(limit, hits)]
+
+
+inverted_index = InvertedIndex()
@@ -0,0 +1,46 @@
+import mmap
+import multiprocessing
+import struct
+import zlib
+
+SLOT = struct.Struct("q")
+
+
+class SharedCounters:
+    """A fixed table of 64-bit counters in an anonymous shared mapping.
+
+    The mapping is created at import, so worker processes forked from a
+    preloading master (gunicorn's ``preload_app``) all see the same
+    counters; that is how a cache bump in one worker reaches the others
+    immediately. Processes that import the app themselves (``uvicorn
+    --workers``) each get their own table and fall back to cache TTLs.
+
+    Keys hash to slots, so two keys may share a counter; bumping one then
+    also invalidates the other, which is safe for version counters.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self._map = mmap.mmap(-1, slots * SLOT.size)
+        self._lock = multiprocessing.Lock()
+
+    def _offset(self, key: str) -> int:
+        return zlib.crc32(key.encode()) % self.slots * SLOT.size
+
+    def get(self, key: str) -> int:
+        return SLOT.unpack_from(self._map, self._offset(key))[0]
+
+    def increment(self, key: str) -> int:
+        offset = self._offset(key)
+        with self._lock:
+            value = SLOT.unpack_from(self._map, offset)[0] + 1
+            SLOT.pack_into(self._map, offset, value)
+        return value
+
+    def set(self, key: str, value: int) -> None:
+        offset = self._offset(key)
+        with self._lock:
+            SLOT.pack_into(self._map, offset, value)
+
+
+shared_counters = SharedCounters(slots=4096)
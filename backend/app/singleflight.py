@@ -0,0 +1,69 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request, status
+
+from .config import settings
+
+
+def request_key(request: Request) -> str:
+    """Route path plus query params in a canonical order."""
+    params = urlencode(sorted(request.query_params.multi_items()))
+    return f"{request.method} {request.url.path}?{params}"
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one.
+
+    The first caller for a key starts ``loader`` as its own task; callers
+    arriving while it runs wait on the same task and get its result or
+    its exception. Because the work is not tied to the first caller,
+    that caller disconnecting does not fail everyone else, so loaders
+    must not borrow request-scoped resources such as the route's session.
+    """
+
+    def __init__(self, timeout: float, detail: str = "Timed out waiting for the database"):
+        self.timeout = timeout
+        self.detail = detail
+        self.leaders = 0
+        self.followers = 0
+        self.timeouts = 0
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(loader())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.followers += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail=self.detail,
+            )
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception retrieved even if every waiter gave up
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "timeouts": self.timeouts,
+        }
+
+
+read_flights = SingleFlight(timeout=settings.singleflight_timeout)
@@ -0,0 +1,162 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from . import models
+from .config import settings
+from .shared_counters import shared_counters
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """The slice of a user that per-request checks need."""
+
+    id: int
+    email: str
+    role: models.UserRole
+    is_active: bool
+    ai_cache_opt_out: bool = False
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            email=user.email,
+            role=user.role,
+            is_active=user.is_active,
+            ai_cache_opt_out=bool(user.ai_cache_opt_out),
+        )
+
+
+class TokenCache:
+    """Bounded LRU of verified bearer tokens.
+
+    Entries are keyed by a SHA-256 of the raw token and live until the
+    token's ``exp`` claim or ``ttl_seconds``, whichever comes first.
+    Invalidating a user also bumps their counter in ``shared_counters``,
+    which drops their entries in every preloaded worker.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, Tuple[float, int, UserSnapshot]]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[UserSnapshot]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, epoch, user = entry
+            if expires_at <= time.monotonic() or epoch != shared_counters.get(f"user:{user.id}"):
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user
+
+    def set(self, token: str, claims: Dict[str, Any], user: UserSnapshot) -> None:
+        if self.max_entries <= 0:
+            return
+        lifetime = self.ttl_seconds
+        if "exp" in claims:
+            lifetime = min(lifetime, claims["exp"] - time.time())
+        if lifetime <= 0:
+            return
+
+        key = self._key(token)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + lifetime, shared_counters.get(f"user:{user.id}"), user)
+            self._keys_by_user.setdefault(user.id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        shared_counters.increment(f"user:{user_id}")
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _remove(self, key: str) -> None:
+        _, _, user = self._entries.pop(key)
+        keys = self._keys_by_user.get(user.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user.id]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+token_cache = TokenCache(
+    max_entries=settings.token_cache_max_entries,
+    ttl_seconds=settings.token_cache_ttl_seconds,
+)
+
+
+def _invalidate_after_commit(target: models.User) -> None:
+    # Drop the user's entries now, and again once the change is committed:
+    # a request that misses in between still reads the old committed row
+    # and would cache it under the epoch bumped here
+    token_cache.invalidate_user(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("invalidated_users", set()).add(target.id)
+
+
+@event.listens_for(models.User, "after_update")
+def _invalidate_changed_user(mapper, connection, target):
+    attrs = inspect(target).attrs
+    if any(attrs[name].history.has_changes() for name in ("email", "role", "is_active", "ai_cache_opt_out")):
+        _invalidate_after_commit(target)
+
+
+@event.listens_for(models.User, "after_delete")
+def _invalidate_deleted_user(mapper, connection, target):
+    _invalidate_after_commit(target)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop("invalidated_users", ()):
+        token_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_users(session):
+    session.info.pop("invalidated_users", None)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark regression check for Dracarys
+Compares a results file from benchmarks.run against a baseline and exits
+non-zero when an endpoint got slower, lost throughput or started failing.
+
+  python -m benchmarks.compare baseline.json benchmark-results.json
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)["endpoints"]
+
+
+def regressions(baseline: dict, current: dict, latency_tolerance: float, rps_tolerance: float, floor_ms: float):
+    for name, before in baseline.items():
+        after = current.get(name)
+        if after is None:
+            yield name, "missing from current results"
+            continue
+        if after["errors"] > before["errors"]:
+            yield name, f"errors {before['errors']} -> {after['errors']}"
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            # Sub-millisecond jitter is noise, so small absolute changes never fail
+            limit = max(before[key] * (1 + latency_tolerance), before[key] + floor_ms)
+            if after[key] > limit:
+                yield name, f"{key} {before[key]} -> {after[key]} (limit {limit:.2f})"
+        if after["rps"] < before["rps"] * (1 - rps_tolerance):
+            yield name, f"rps {before['rps']} -> {after['rps']}"
+
+
+def main():
+    """Main comparison function"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--latency-tolerance", type=float, default=0.20, help="allowed relative latency increase")
+    parser.add_argument("--rps-tolerance", type=float, default=0.20, help="allowed relative throughput drop")
+    parser.add_argument("--floor-ms", type=float, default=2.0, help="latency increases below this always pass")
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    found = list(regressions(baseline, current, args.latency_tolerance, args.rps_tolerance, args.floor_ms))
+    for name in current:
+        if name not in baseline:
+            print(f"ℹ️  {name}: new endpoint, no baseline")
+    if found:
+        for name, reason in found:
+            print(f"❌ {name}: {reason}")
+        print(f"\n❌ {len(found)} regression(s) against {args.baseline}")
+        sys.exit(1)
+    print(f"✅ No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
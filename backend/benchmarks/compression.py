@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Compression benchmark for Dracarys
+Fetches each route's JSON body uncompressed, then reports per route and
+encoding the compression ratio and the CPU time to compress it at the
+configured levels, plus what the server actually sent for that
+Accept-Encoding (cached variants make repeat requests free).
+
+  python -m benchmarks.compression                         # in-process over ASGI
+  python -m benchmarks.compression --url http://host:8000  # a running deployment
+
+Seed the database with benchmarks.seed first.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+from app.compression import CODECS, available_encodings
+from app.config import settings
+from .run import in_process_client, remote_client
+from .seed import PAGES
+
+ROUTES: Dict[str, str] = {
+    "/content/{page}": f"/content/{PAGES[0]}",
+    "/products": "/products?limit=50",
+    "/products (max page)": f"/products?limit={settings.products_max_page_size}",
+    "/products/facets": "/products/facets",
+    "/pages/{page}/bundle": "/pages/home/bundle",
+}
+
+
+async def fetch(client: httpx.AsyncClient, path: str, accept_encoding: str) -> Tuple[bytes, str]:
+    """The body exactly as sent (not decoded) and its Content-Encoding"""
+    async with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        response.raise_for_status()
+        raw = b"".join([chunk async for chunk in response.aiter_raw()])
+        return raw, response.headers.get("content-encoding", "identity")
+
+
+def cpu_ms(encoding: str, body: bytes, rounds: int) -> Tuple[bytes, float]:
+    """Compressed body and median CPU milliseconds per compression"""
+    codec = CODECS[encoding][1]
+    samples: List[float] = []
+    for _ in range(rounds):
+        started = time.thread_time()
+        encoded = codec(body)
+        samples.append((time.thread_time() - started) * 1000)
+    return encoded, statistics.median(samples)
+
+
+async def measure(client: httpx.AsyncClient, encodings: List[str], rounds: int) -> Dict[str, dict]:
+    results = {}
+    for name, path in ROUTES.items():
+        body, _ = await fetch(client, path, "identity")
+        route = {"path": path, "bytes": len(body), "encodings": {}}
+        for encoding in encodings:
+            encoded, cost = cpu_ms(encoding, body, rounds)
+            served, served_as = await fetch(client, path, encoding)
+            route["encodings"][encoding] = {
+                "bytes": len(encoded),
+                "ratio": round(len(body) / len(encoded), 2) if encoded else None,
+                "cpu_ms": round(cost, 3),
+                "mb_per_cpu_second": round(len(body) / 1e6 / (cost / 1000), 1) if cost else None,
+                "served_as": served_as,
+                "served_bytes": len(served),
+            }
+        results[name] = route
+        best = min(route["encodings"].items(), key=lambda item: item[1]["bytes"], default=None)
+        summary = f"best {best[0]} x{best[1]['ratio']}" if best else "no encodings available"
+        print(f"✅ {name:<22} {len(body):>9} bytes, {summary}")
+    return results
+
+
+def main():
+    """Main compression benchmark function"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--rounds", type=int, default=20, help="compressions per route and encoding; the median counts")
+    parser.add_argument("--output", default="compression-results.json")
+    args = parser.parse_args()
+
+    encodings = available_encodings(["br", "zstd", "gzip"])
+    factory = (lambda: remote_client(args.url, 1)) if args.url else in_process_client
+    print(f"🗜️  Compression per route ({', '.join(encodings)}; min size {settings.compression_min_size} bytes)")
+
+    async def run():
+        async with factory() as client:
+            return await measure(client, encodings, args.rounds)
+
+    report = {
+        "meta": {
+            "mode": "remote" if args.url else "in-process",
+            "levels": {
+                "gzip": settings.compression_gzip_level,
+                "br": settings.compression_brotli_quality,
+                "zstd": settings.compression_zstd_level,
+            },
+            "min_size": settings.compression_min_size,
+            "rounds": args.rounds,
+        },
+        "routes": asyncio.run(run()),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"\n📄 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
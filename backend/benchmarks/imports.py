@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Import-time budget for Dracarys
+Profiles `import app.main` with `python -X importtime` in fresh
+interpreters and fails (exit 1) when it exceeds the budget or when a
+module that should load lazily is imported eagerly.
+
+  python -m benchmarks.imports --budget-ms 2000
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Loaded on first use (see app.auth, app.ai_gateway, app.ai_cache, app.database, app.compression, app.images)
+LAZY_MODULES = ("jose", "passlib", "bcrypt", "cryptography", "httpx", "numpy", "asyncpg", "psycopg2", "aiosqlite",
+                "brotli", "zstandard", "PIL")
+
+PROBE = "import sys, app.main; print(','.join(sorted(m for m in sys.modules if '.' not in m)))"
+
+
+def profile() -> Tuple[Dict[str, Tuple[int, int]], List[str]]:
+    """Self and cumulative microseconds per module, and the top-level modules loaded"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE],
+                            capture_output=True, text=True, check=True)
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings, result.stdout.strip().split(",")
+
+
+def main():
+    """Main import profiling function"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=2000, help="limit for the cumulative import of app.main")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to profile; the fastest counts")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", default="import-results.json")
+    args = parser.parse_args()
+
+    runs = [profile() for _ in range(args.runs)]
+    timings, loaded = min(runs, key=lambda run: run[0]["app.main"][1])
+    total_ms = timings["app.main"][1] / 1000
+    app_ms = sum(self_us for name, (self_us, _) in timings.items() if name.split(".")[0] == "app") / 1000
+    slowest = sorted(timings.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    eager = [name for name in LAZY_MODULES if name in loaded]
+
+    print(f"⏱️  import app.main: {total_ms:.1f} ms (app's own modules {app_ms:.1f} ms, budget {args.budget_ms:.0f} ms)")
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"   {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms total  {name}")
+
+    report = {
+        "import_app_main_ms": round(total_ms, 1),
+        "app_modules_ms": round(app_ms, 1),
+        "budget_ms": args.budget_ms,
+        "eager_lazy_modules": eager,
+        "slowest": [{"module": name, "self_ms": round(s / 1000, 1), "total_ms": round(c / 1000, 1)}
+                    for name, (s, c) in slowest],
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+    failed = False
+    if eager:
+        print(f"❌ Imported eagerly but meant to load on first use: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"❌ import app.main took {total_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print(f"\n✅ Within the import budget; results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Benchmark runner for Dracarys
+Drives the API with a closed-loop asyncio load generator and reports
+throughput and p50/p95/p99 latency per endpoint as JSON.
+
+  python -m benchmarks.run                         # in-process over ASGI
+  python -m benchmarks.run --server --workers 2    # spawn uvicorn
+  python -m benchmarks.run --url http://host:8000  # a running deployment
+
+Seed the database with benchmarks.seed first.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+
+# Load from one client IP would trip the per-IP limits; spawned servers inherit this
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from app.auth import create_access_token
+from app.config import settings
+from .seed import BENCH_PASSWORD, PAGES, CATEGORIES, bench_email
+
+
+class Scenario(NamedTuple):
+    method: str
+    path: Callable[[int], str]
+    authenticated: bool = False
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "/auth/login": Scenario("POST", lambda i: f"/auth/login?email={bench_email(i)}&password={BENCH_PASSWORD}"),
+    "/auth/me": Scenario("GET", lambda i: "/auth/me", authenticated=True),
+    "/content/{page}": Scenario("GET", lambda i: f"/content/{PAGES[i % len(PAGES)]}"),
+    "/products": Scenario("GET", lambda i: f"/products?category={CATEGORIES[i % len(CATEGORIES)]}&limit=50"),
+    # Distinct prompts, so every request takes the agent path rather than the cache
+    "/ai/process": Scenario("POST", lambda i: f"/ai/process?input_text=benchmark+prompt+{i}", authenticated=True),
+}
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, users: int,
+                       requests: int, concurrency: int, warmup: int) -> dict:
+    # Tokens are minted locally instead of logging in, so bcrypt only shows
+    # up in the /auth/login numbers; the server must share SECRET_KEY
+    tokens = [create_access_token({"sub": bench_email(i)}) for i in range(min(users, concurrency))]
+    counter = itertools.count()
+    latencies: List[float] = []
+    errors = 0
+
+    async def call(i: int) -> bool:
+        headers = {"Authorization": f"Bearer {tokens[i % len(tokens)]}"} if scenario.authenticated else None
+        response = await client.request(scenario.method, scenario.path(i % users), headers=headers)
+        return response.status_code < 400
+
+    async def worker(limit: int, record: bool):
+        nonlocal errors
+        while True:
+            i = next(counter)
+            if i >= limit:
+                return
+            started = time.perf_counter()
+            try:
+                ok = await call(i)
+            except httpx.HTTPError:
+                ok = False
+            if record:
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+    await asyncio.gather(*(worker(warmup, False) for _ in range(concurrency)))
+    counter = itertools.count()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(requests, True) for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def in_process_client():
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            yield client
+
+
+@asynccontextmanager
+async def remote_client(url: str, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        for _ in range(100):
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+        else:
+            raise RuntimeError(f"{url} did not become healthy")
+        yield client
+
+
+def spawn_server(port: int, workers: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--no-access-log"],
+        env=os.environ.copy(),
+    )
+
+
+async def run(args, client_factory) -> Dict[str, dict]:
+    results = {}
+    async with client_factory() as client:
+        for name in args.endpoints:
+            requests = args.login_requests if name == "/auth/login" else args.requests
+            results[name] = await run_scenario(
+                client, SCENARIOS[name], args.users, requests, args.concurrency, args.warmup
+            )
+            print(f"✅ {name:<18} {results[name]}")
+    return results
+
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    target.add_argument("--server", action="store_true", help="spawn uvicorn and benchmark it over HTTP")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--endpoints", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=2000, help="timed requests per endpoint")
+    parser.add_argument("--login-requests", type=int, default=200, help="timed requests for /auth/login (bcrypt bound)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--users", type=int, default=1000, help="number of seeded bench users to spread requests over")
+    parser.add_argument("--output", default="benchmark-results.json")
+    args = parser.parse_args()
+
+    process: Optional[subprocess.Popen] = None
+    if args.server:
+        process = spawn_server(args.port, args.workers)
+        mode, url = f"uvicorn x{args.workers}", f"http://127.0.0.1:{args.port}"
+        factory = lambda: remote_client(url, args.concurrency)
+    elif args.url:
+        mode = "remote"
+        factory = lambda: remote_client(args.url, args.concurrency)
+    else:
+        mode = "in-process"
+        factory = in_process_client
+
+    print(f"🚀 Benchmarking ({mode}, concurrency {args.concurrency})")
+    try:
+        results = asyncio.run(run(args, factory))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "mode": mode,
+            "database": settings.database_url.split(":", 1)[0] if not args.url else "remote",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "python": platform.python_version(),
+        },
+        "endpoints": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"\n📄 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
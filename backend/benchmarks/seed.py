@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark data seeding for Dracarys
+Migrates the configured database to head (so it has everything the
+migrations add beyond the models: the search_vector column and triggers,
+concurrently built indexes), then fills it with users, content rows and
+products at a chosen scale.
+Run from backend/: python -m benchmarks.seed --products 100000
+"""
+
+import argparse
+import os
+import time
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import delete, func, insert, select, text
+from app.auth import get_password_hash
+from app.database import engine
+from app.facets import category_stats_statements
+from app.models import Content, Product, User, UserRole
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DOMAIN = "bench.dracarys.com"
+BENCH_PASSWORD = "bench-password"
+PAGES = ("home", "about", "contact", "products")
+CATEGORIES = ("ai", "web", "mobile", "consulting", "integration", "analytics")
+FEATURES = ("Real-time Data", "API Integration", "Offline Support", "Push Notifications",
+            "Custom Reports", "Mobile Responsive", "24/7 Availability", "Webhook Support")
+
+def bench_email(i: int) -> str:
+    return f"user-{i}@{BENCH_DOMAIN}"
+
+def chunks(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def user_rows(count: int):
+    # One bcrypt hash shared by every bench user keeps seeding fast
+    hashed = get_password_hash(BENCH_PASSWORD)
+    for i in range(count):
+        yield {"email": bench_email(i), "name": f"Bench User {i}", "hashed_password": hashed,
+               "role": UserRole.SUPER_USER if i == 0 else UserRole.CLIENT, "is_active": True}
+
+def content_rows(count: int):
+    for i in range(count):
+        yield {"page": PAGES[i % len(PAGES)] if i < 400 else f"bench-page-{i % 500}",
+               "section": f"section-{i}", "title": f"Section {i}", "content": "Lorem ipsum dolor sit amet. " * 8,
+               "order_index": i % 20, "is_active": i % 20 != 0}
+
+def product_rows(count: int):
+    for i in range(count):
+        yield {"name": f"Bench product {i}", "description": f"Benchmark product number {i} for load tests.",
+               "price": (i * 7919) % 100000, "category": CATEGORIES[i % len(CATEGORIES)],
+               "features": [FEATURES[i % len(FEATURES)], FEATURES[(i * 3 + 1) % len(FEATURES)]],
+               "rating": i % 51, "reviews_count": (i * 13) % 500, "is_active": i % 25 != 0}
+
+def migrate():
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    command.upgrade(config, "head")
+
+def load(conn, model, rows, batch_size: int) -> int:
+    total = 0
+    for batch in chunks(rows, batch_size):
+        conn.execute(insert(model), batch)
+        total += len(batch)
+    return total
+
+def main():
+    """Main seeding function"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--content", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=10000, help="10k to 1M is the intended range")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--reset", action="store_true", help="delete earlier bench rows first")
+    args = parser.parse_args()
+
+    print(f"🌱 Seeding {engine.url.render_as_string(hide_password=True)}")
+    migrate()
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        if args.reset:
+            conn.execute(delete(User).where(User.email.like(f"%@{BENCH_DOMAIN}")))
+            conn.execute(delete(Content).where(Content.section.like("section-%")))
+            conn.execute(delete(Product).where(Product.name.like("Bench product %")))
+            print("🧹 Removed earlier bench rows")
+        elif conn.execute(select(func.count()).select_from(User).where(User.email == bench_email(0))).scalar():
+            print("ℹ️  Bench users already exist; rerun with --reset to reseed")
+            return
+
+        print(f"✅ {load(conn, User, user_rows(args.users), args.batch_size)} users")
+        print(f"✅ {load(conn, Content, content_rows(args.content), args.batch_size)} content rows")
+        print(f"✅ {load(conn, Product, product_rows(args.products), args.batch_size)} products")
+        for statement in category_stats_statements(engine.dialect.name):
+            conn.execute(statement)
+
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("ANALYZE"))
+    print(f"\n✅ Seeded in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
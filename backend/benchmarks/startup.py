@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Start-up benchmark for Dracarys
+Launches the production server profile (gunicorn, preloaded) and plain
+multi-worker uvicorn, and reports for each: time until /health answers,
+memory per worker (RSS, plus PSS/USS, which discount pages shared with
+the master) and whether in-flight requests survive a SIGTERM. Linux only,
+since memory is read from /proc.
+
+  python -m benchmarks.startup --workers 4
+  python -m benchmarks.startup --drain   # needs benchmarks.seed users
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from app.auth import create_access_token
+from .seed import bench_email
+
+SERVERS = {
+    "gunicorn": lambda port, workers: [
+        sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app",
+        "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--access-logfile", "/dev/null",
+    ],
+    "uvicorn": lambda port, workers: [
+        sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--no-access-log",
+    ],
+}
+
+
+def children(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except FileNotFoundError:
+        return []
+
+
+def descendants(pid: int) -> List[int]:
+    found = []
+    for child in children(pid):
+        found.append(child)
+        found.extend(descendants(child))
+    return found
+
+
+def memory_mb(pid: int) -> Dict[str, float]:
+    """RSS, PSS and USS of one process from smaps_rollup"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "uss_mb": round(uss / 1024, 1),
+    }
+
+
+def is_worker(pid: int) -> bool:
+    # uvicorn --workers also starts multiprocessing's resource tracker
+    with open(f"/proc/{pid}/cmdline", "rb") as f:
+        return b"resource_tracker" not in f.read()
+
+
+def wait_healthy(url: str, timeout: float) -> None:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.02)
+    raise RuntimeError(f"{url} did not become healthy within {timeout}s")
+
+
+def import_seconds() -> float:
+    """Wall time of `import app.main` in a fresh interpreter, minus interpreter start"""
+    def timed(code: str) -> float:
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        return time.perf_counter() - started
+    return round(min(timed("import app.main") for _ in range(3)) - min(timed("pass") for _ in range(3)), 3)
+
+
+async def drain_check(url: str, master: subprocess.Popen, requests: int) -> Dict[str, int]:
+    """Start slow AI requests, SIGTERM the server, and count how many still finish"""
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        async def call(i: int) -> bool:
+            token = create_access_token({"sub": bench_email(i)})
+            try:
+                response = await client.post(
+                    f"/ai/process?input_text=drain+check+request+{i}+with+several+words",
+                    headers={"Authorization": f"Bearer {token}"},
+                )
+                return response.status_code == 200
+            except httpx.HTTPError:
+                return False
+
+        calls = [asyncio.ensure_future(call(i)) for i in range(requests)]
+        await asyncio.sleep(0.3)
+        master.send_signal(signal.SIGTERM)
+        results = await asyncio.gather(*calls)
+    return {"in_flight": requests, "completed": sum(results)}
+
+
+def measure(name: str, port: int, workers: int, drain: int, env: Dict[str, str]) -> dict:
+    started = time.perf_counter()
+    master = subprocess.Popen(SERVERS[name](port, workers), env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f"http://127.0.0.1:{port}"
+        wait_healthy(url, 60)
+        cold_start = time.perf_counter() - started
+        # Let every worker finish booting before reading memory
+        deadline = time.perf_counter() + 30
+        while len([pid for pid in children(master.pid) if is_worker(pid)]) < workers and time.perf_counter() < deadline:
+            time.sleep(0.1)
+        time.sleep(1)
+
+        worker_pids = [pid for pid in children(master.pid) if is_worker(pid)]
+        worker_memory = [memory_mb(pid) for pid in worker_pids]
+        total_pss = sum(memory_mb(pid)["pss_mb"] for pid in [master.pid] + descendants(master.pid))
+        result = {
+            "cold_start_s": round(cold_start, 3),
+            "workers": len(worker_pids),
+            "master": memory_mb(master.pid),
+            "worker_avg": {
+                key: round(sum(m[key] for m in worker_memory) / len(worker_memory), 1)
+                for key in ("rss_mb", "pss_mb", "uss_mb")
+            } if worker_memory else {},
+            "total_pss_mb": round(total_pss, 1),
+        }
+        if drain:
+            result["drain"] = asyncio.run(drain_check(url, master, drain))
+        return result
+    finally:
+        if master.poll() is None:
+            master.terminate()
+        master.wait(timeout=60)
+
+
+def main():
+    """Main start-up benchmark function"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", nargs="+", choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--drain", type=int, nargs="?", const=8, default=0,
+                        help="also check that N slow in-flight AI requests survive SIGTERM")
+    parser.add_argument("--output", default="startup-results.json")
+    args = parser.parse_args()
+
+    env = os.environ.copy()
+    agent: Optional[subprocess.Popen] = None
+    if args.drain:
+        # Slow local agent, so requests are still running when SIGTERM lands
+        agent_port = args.port + 1
+        agent = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "fake_agent:app", "--port", str(agent_port), "--no-access-log"],
+            env={**env, "FAKE_AGENT_TOKEN_DELAY": "0.2"}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        wait_agent = time.perf_counter() + 30
+        while time.perf_counter() < wait_agent:
+            try:
+                httpx.get(f"http://127.0.0.1:{agent_port}/docs", timeout=1)
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        env.update({"AI_AGENT_URL": f"http://127.0.0.1:{agent_port}/", "AI_CACHE_ENABLED": "false"})
+
+    print(f"🚀 Measuring start-up with {args.workers} worker(s)")
+    results = {}
+    try:
+        for name in args.servers:
+            results[name] = measure(name, args.port, args.workers, args.drain, env)
+            print(f"✅ {name:<9} {results[name]}")
+    finally:
+        if agent is not None:
+            agent.terminate()
+            agent.wait(timeout=30)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "workers": args.workers,
+            "import_app_s": import_seconds(),
+        },
+        "servers": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"\n📄 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
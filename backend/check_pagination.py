@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Keyset pagination check for Dracarys
+Seeds products whose created_at comes from the server default (so many
+share a timestamp) and from Python (with and without microseconds), walks
+them a few rows per page in every sort order /products offers, passing the
+cursor through encode_cursor/decode_cursor as clients do, and verifies each
+walk visits every row exactly once in order. Everything runs inside one
+transaction that is rolled back, so it is safe against a migrated database.
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timezone
+from sqlalchemy import insert, select
+from app.database import async_engine
+from app.models import Product
+from app.pagination import decode_cursor, encode_cursor, keyset_filter, parse_sort, sort_key
+
+MARKER = "pagination-check"
+PAGE_SIZE = 3
+
+def seed_rows():
+    """Ties on the server default, plus explicit timestamps on either side of it"""
+    defaults = [{"name": f"Default {i}", "category": MARKER} for i in range(7)]
+    explicit = [
+        {"name": "On the second", "category": MARKER,
+         "created_at": datetime(2024, 2, 29, 23, 59, 59, tzinfo=timezone.utc)},
+        {"name": "With micros", "category": MARKER,
+         "created_at": datetime(2024, 2, 29, 23, 59, 59, 120000, tzinfo=timezone.utc)},
+        {"name": "Same micros", "category": MARKER,
+         "created_at": datetime(2024, 2, 29, 23, 59, 59, 120000, tzinfo=timezone.utc)},
+        {"name": "Future", "category": MARKER,
+         "created_at": datetime(2999, 1, 1, tzinfo=timezone.utc)},
+    ]
+    return defaults, explicit
+
+def ordered(query, sort_column, descending, dialect):
+    key = sort_key(sort_column, dialect)
+    if descending:
+        return query.order_by(key.desc(), Product.id.desc())
+    return query.order_by(key, Product.id)
+
+async def walk(conn, sort: str, total: int) -> list:
+    """Ids in the order the cursor visits them, PAGE_SIZE at a time.
+    Stops after ``total`` rows' worth of pages should the cursor never advance."""
+    dialect = conn.dialect.name
+    sort_field, descending = parse_sort(sort)
+    sort_column = getattr(Product, sort_field)
+    base = select(Product.id, sort_column).where(Product.category == MARKER)
+    seen, after = [], None
+    for _ in range(total // PAGE_SIZE + 2):
+        query = base
+        if after is not None:
+            query = query.where(keyset_filter(sort_column, Product.id, *after, descending, dialect))
+        rows = (await conn.execute(ordered(query, sort_column, descending, dialect).limit(PAGE_SIZE + 1))).all()
+        seen.extend(row[0] for row in rows[:PAGE_SIZE])
+        if len(rows) <= PAGE_SIZE:
+            return seen
+        last = rows[PAGE_SIZE - 1]
+        after = decode_cursor(encode_cursor(last[1], last[0]), is_datetime=sort_field == "created_at")
+    return seen
+
+async def run() -> int:
+    failures = 0
+    async with async_engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            defaults, explicit = seed_rows()
+            # One statement, so the server default gives these rows the same timestamp
+            await conn.execute(insert(Product), defaults)
+            await conn.execute(insert(Product), explicit)
+            for sort in ("id", "-id", "created_at", "-created_at"):
+                sort_field, descending = parse_sort(sort)
+                sort_column = getattr(Product, sort_field)
+                query = select(Product.id).where(Product.category == MARKER)
+                expected = (await conn.execute(ordered(query, sort_column, descending, conn.dialect.name))).scalars().all()
+                actual = await walk(conn, sort, len(expected))
+                duplicates = len(actual) - len(set(actual))
+                missing = set(expected) - set(actual)
+                if actual == expected:
+                    print(f"✅ sort={sort}: {len(actual)} rows, no duplicates or gaps")
+                else:
+                    failures += 1
+                    print(f"❌ sort={sort}: {duplicates} duplicate(s), {len(missing)} missing\n"
+                          f"   expected: {expected}\n   walked:   {actual}")
+        finally:
+            await trans.rollback()
+    await async_engine.dispose()
+    return failures
+
+def main():
+    """Main check function"""
+    print(f"🔍 Walking keyset pages against {async_engine.url.render_as_string(hide_password=True)}")
+    failures = asyncio.run(run())
+    if failures:
+        print(f"\n❌ {failures} pagination check(s) failed")
+        sys.exit(1)
+    print("\n✅ Every sort order pages through each row exactly once")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Fake AI agent for local development and tests
+Speaks the protocol app.ai_gateway expects, echoing the input back word
+by word. Run with: uvicorn fake_agent:app --port 8001
+"""
+
+import asyncio
+import json
+import os
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+# Seconds to wait before each token, to mimic a slow model
+TOKEN_DELAY = float(os.getenv("FAKE_AGENT_TOKEN_DELAY", "0.05"))
+
+app = FastAPI(title="Fake AI Agent")
+
+class AgentRequest(BaseModel):
+    input: str
+    user_id: int
+    stream: bool = False
+
+def tokens_for(text: str):
+    words = f"AI processed: {text}".split(" ")
+    return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+@app.post("/")
+async def respond(request: AgentRequest):
+    tokens = tokens_for(request.input)
+    if not request.stream:
+        await asyncio.sleep(TOKEN_DELAY * len(tokens))
+        return {"response": "".join(tokens)}
+
+    async def generate():
+        for token in tokens:
+            await asyncio.sleep(TOKEN_DELAY)
+            yield json.dumps({"token": token}) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=8001)
@@ -0,0 +1,48 @@
+"""
+Production server profile for Dracarys
+gunicorn -c gunicorn.conf.py app.main:app
+
+The app is imported once in the master (preload_app) and workers are
+forked from it, so they share its code pages and the cache version
+counters in app.shared_counters. Settings come from the environment and
+.env like the app's own.
+"""
+
+import importlib
+import multiprocessing
+
+from app.config import settings
+
+bind = settings.web_bind
+workers = settings.web_workers or multiprocessing.cpu_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# On SIGTERM workers stop accepting connections and get graceful_timeout
+# seconds to finish in-flight requests before they are killed
+timeout = settings.web_timeout
+graceful_timeout = settings.web_graceful_timeout
+keepalive = settings.web_keepalive
+
+accesslog = "-"
+errorlog = "-"
+
+
+# The app imports these on first use; importing them once in the master
+# means forked workers share them instead of each loading its own copy
+PRELOAD_MODULES = ("jose.jwt", "passlib.context", "passlib.handlers.bcrypt", "httpx", "numpy", "asyncpg")
+
+
+def on_starting(server):
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+
+
+def post_fork(server, worker):
+    # Engines are built lazily in each worker; should the master have built
+    # the sync one, drop its pool without closing connections under it
+    from app import database
+
+    engine = vars(database).get("engine")
+    if engine is not None:
+        engine.dispose(close=False)
@@ -1,6 +1,7 @@
 from logging.config import fileConfig
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
+from sqlalchemy.engine import make_url
 from alembic import context
 import os
 import sys
@@ -11,6 +12,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.database import Base
 from app.models import User, Content, Product
 from app.config import settings
+from app.ai_history import PARTITION_PREFIX
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -33,6 +35,24 @@ target_metadata = Base.metadata
 def get_url():
     return settings.database_url
 
+def include_object_for(dialect_name):
+    """Leave out of autogenerate what the models don't describe on purpose:
+    indexes limited to another dialect with ddl_if, the monthly partitions
+    of ai_interactions (created at runtime) and PostgreSQL's trigger-kept
+    products.search_vector."""
+    def include_object(object, name, type_, reflected, compare_to):
+        if type_ == "index" and not reflected:
+            ddl_if = object._ddl_if
+            if ddl_if is not None and ddl_if.dialect not in (None, dialect_name):
+                return False
+        table = object if type_ == "table" else getattr(object, "table", None)
+        if reflected and table is not None and table.name.startswith(PARTITION_PREFIX):
+            return False
+        if reflected and type_ in ("column", "index") and name and "search_vector" in name:
+            return False
+        return True
+    return include_object
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -49,6 +69,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object_for(make_url(url).get_backend_name()),
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -74,7 +95,8 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_object=include_object_for(connection.dialect.name),
         )
 
         with context.begin_transaction():
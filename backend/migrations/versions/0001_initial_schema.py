@@ -0,0 +1,83 @@
+"""initial schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+Databases created earlier with Base.metadata.create_all already match
+this revision; mark them with ``alembic stamp 0001`` before upgrading.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('hashed_password', sa.String(), nullable=False),
+        sa.Column('role', sa.Enum('SUPER_USER', 'CLIENT', name='userrole'), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_users_id', 'users', ['id'])
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+
+    op.create_table(
+        'content',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('page', sa.String(), nullable=False),
+        sa.Column('section', sa.String(), nullable=False),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('content', sa.Text(), nullable=True),
+        sa.Column('image_url', sa.String(), nullable=True),
+        sa.Column('order_index', sa.Integer(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_content_id', 'content', ['id'])
+    op.create_index('ix_content_page', 'content', ['page'])
+
+    op.create_table(
+        'products',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('price', sa.Integer(), nullable=True),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('image_url', sa.String(), nullable=True),
+        sa.Column('features', sa.Text(), nullable=True),
+        sa.Column('rating', sa.Integer(), nullable=True),
+        sa.Column('reviews_count', sa.Integer(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_products_id', 'products', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_id', table_name='products')
+    op.drop_table('products')
+    op.drop_index('ix_content_page', table_name='content')
+    op.drop_index('ix_content_id', table_name='content')
+    op.drop_table('content')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_table('users')
+    sa.Enum(name='userrole').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,48 @@
+"""partial and expression indexes for hot query shapes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction; build without blocking writes
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_content_page_order_active', 'content', ['page', 'order_index'],
+            postgresql_where=sa.text('is_active'), sqlite_where=sa.text('is_active = 1'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_products_category_active', 'products', ['category'],
+            postgresql_where=sa.text('is_active'), sqlite_where=sa.text('is_active = 1'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_products_created_at_id_active', 'products', ['created_at', 'id'],
+            postgresql_where=sa.text('is_active'), sqlite_where=sa.text('is_active = 1'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_users_email_lower', 'users', [sa.text('lower(email)')],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_email_lower', table_name='users', postgresql_concurrently=True)
+        op.drop_index('ix_products_created_at_id_active', table_name='products', postgresql_concurrently=True)
+        op.drop_index('ix_products_category_active', table_name='products', postgresql_concurrently=True)
+        op.drop_index('ix_content_page_order_active', table_name='content', postgresql_concurrently=True)
@@ -0,0 +1,87 @@
+"""tsvector column and GIN index for product search
+
+``search_vector`` is a plain column kept current by the
+``products_search_vector`` trigger, not a stored generated column, so
+adding it does not rewrite ``products`` under an exclusive lock:
+
+1. add the nullable column and the trigger that fills it on every insert
+   and on updates of the searched columns;
+2. backfill existing rows in id-range batches, each in its own transaction;
+3. build the GIN index concurrently.
+
+SQLite databases are left alone; search falls back to the in-memory index
+there.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def search_vector(row: str) -> str:
+    return f"""
+        setweight(to_tsvector('simple', coalesce({row}.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce({row}.description, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce({row}.features, '')), 'C')
+    """
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.execute("ALTER TABLE products ADD COLUMN search_vector tsvector")
+    op.execute(
+        f"""
+        CREATE FUNCTION products_search_vector() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.search_vector := {search_vector('NEW')};
+            RETURN NEW;
+        END $$
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER products_search_vector BEFORE INSERT OR UPDATE OF name, description, features "
+        "ON products FOR EACH ROW EXECUTE FUNCTION products_search_vector()"
+    )
+
+    # Each batch commits on its own so row locks are held only briefly;
+    # rows written meanwhile are filled by the trigger
+    with op.get_context().autocommit_block():
+        max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM products")).scalar()
+        for start in range(0, max_id, BATCH_SIZE):
+            bind.execute(
+                sa.text(f"UPDATE products SET search_vector = {search_vector('products')} "
+                        "WHERE id > :start AND id <= :stop"),
+                {"start": start, "stop": start + BATCH_SIZE},
+            )
+
+        op.create_index(
+            'ix_products_search_vector_active', 'products', ['search_vector'],
+            postgresql_using='gin', postgresql_where=sa.text('is_active'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_products_search_vector_active', table_name='products', postgresql_concurrently=True)
+    op.execute("DROP TRIGGER products_search_vector ON products")
+    op.execute("DROP FUNCTION products_search_vector()")
+    op.drop_column('products', 'search_vector')
@@ -0,0 +1,141 @@
+"""store product features as jsonb with a GIN index
+
+On PostgreSQL the text column is converted without a table rewrite:
+
+1. add a ``features_jsonb`` column and a trigger that fills it on every
+   insert/update, and have ``products_search_vector`` index features as
+   JSON (strings and keys) from now on;
+2. backfill existing rows in id-range batches, each in its own transaction,
+   which also refreshes their ``search_vector``;
+3. build the new GIN index concurrently;
+4. swap the columns in one short transaction.
+
+Text that is not valid JSON is kept as a JSON string. On SQLite the column
+already holds JSON text, so only invalid values are quoted.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def search_vector(row: str, features: str) -> str:
+    return f"""
+        setweight(to_tsvector('simple', coalesce({row}.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce({row}.description, '')), 'B') ||
+        setweight(coalesce(jsonb_to_tsvector('simple', {features}, '["string", "key"]'), ''::tsvector), 'C')
+    """
+
+
+def text_search_vector(row: str) -> str:
+    """What 0004 indexes, while features is still text"""
+    return f"""
+        setweight(to_tsvector('simple', coalesce({row}.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce({row}.description, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce({row}.features, '')), 'C')
+    """
+
+
+def replace_search_function(expression: str) -> None:
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION products_search_vector() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.search_vector := {expression};
+            RETURN NEW;
+        END $$
+        """
+    )
+
+
+def create_search_trigger() -> None:
+    op.execute(
+        "CREATE TRIGGER products_search_vector BEFORE INSERT OR UPDATE OF name, description, features "
+        "ON products FOR EACH ROW EXECUTE FUNCTION products_search_vector()"
+    )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        op.execute("UPDATE products SET features = json_quote(features) WHERE features IS NOT NULL AND NOT json_valid(features)")
+        return
+
+    op.execute(
+        """
+        CREATE FUNCTION products_features_jsonb(value text) RETURNS jsonb
+        LANGUAGE plpgsql IMMUTABLE AS $$
+        BEGIN
+            RETURN value::jsonb;
+        EXCEPTION WHEN others THEN
+            RETURN to_jsonb(value);
+        END $$
+        """
+    )
+    op.add_column('products', sa.Column('features_jsonb', sa.dialects.postgresql.JSONB(), nullable=True))
+    op.execute(
+        """
+        CREATE FUNCTION products_features_sync() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.features_jsonb := products_features_jsonb(NEW.features);
+            RETURN NEW;
+        END $$
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER products_features_sync BEFORE INSERT OR UPDATE ON products "
+        "FOR EACH ROW EXECUTE FUNCTION products_features_sync()"
+    )
+    replace_search_function(search_vector('NEW', 'products_features_jsonb(NEW.features)'))
+
+    # Each batch commits on its own so row locks are held only briefly;
+    # touching features fires both triggers
+    with op.get_context().autocommit_block():
+        max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM products")).scalar()
+        for start in range(0, max_id, BATCH_SIZE):
+            bind.execute(
+                sa.text("UPDATE products SET features = features WHERE id > :start AND id <= :stop"),
+                {"start": start, "stop": start + BATCH_SIZE},
+            )
+
+        op.create_index(
+            'ix_products_features_active', 'products', ['features_jsonb'],
+            postgresql_using='gin', postgresql_ops={'features_jsonb': 'jsonb_path_ops'},
+            postgresql_where=sa.text('is_active'), postgresql_concurrently=True,
+        )
+
+    # The search trigger lists features, so it goes while the columns swap
+    op.execute("DROP TRIGGER products_features_sync ON products")
+    op.execute("DROP FUNCTION products_features_sync()")
+    op.execute("DROP TRIGGER products_search_vector ON products")
+    op.drop_column('products', 'features')
+    op.alter_column('products', 'features_jsonb', new_column_name='features')
+    op.execute("DROP FUNCTION products_features_jsonb(text)")
+    replace_search_function(search_vector('NEW', 'NEW.features'))
+    create_search_trigger()
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("DROP TRIGGER products_search_vector ON products")
+    op.drop_index('ix_products_features_active', table_name='products')
+    op.execute("ALTER TABLE products ALTER COLUMN features TYPE text USING features::text")
+    replace_search_function(text_search_vector('NEW'))
+    create_search_trigger()
+    op.execute(f"UPDATE products SET search_vector = {text_search_vector('products')}")
@@ -0,0 +1,42 @@
+"""per-category product aggregates for the facets endpoint
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'product_category_stats',
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('product_count', sa.Integer(), nullable=False),
+        sa.Column('min_price', sa.Integer(), nullable=True),
+        sa.Column('max_price', sa.Integer(), nullable=True),
+        sa.Column('avg_rating', sa.Float(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('category'),
+    )
+    op.execute(
+        """
+        INSERT INTO product_category_stats (category, product_count, min_price, max_price, avg_rating)
+        SELECT category, count(*), min(price), max(price), avg(rating)
+        FROM products
+        WHERE is_active
+        GROUP BY category
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('product_category_stats')
@@ -0,0 +1,58 @@
+"""queue for asynchronous AI jobs
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ai_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('idempotency_key', sa.String(), nullable=True),
+        sa.Column('input_text', sa.Text(), nullable=False),
+        sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED', name='aijobstatus'), nullable=False),
+        sa.Column('priority', sa.Integer(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_at', sa.Float(), nullable=False),
+        sa.Column('lease_expires_at', sa.Float(), nullable=True),
+        sa.Column('cache_scope', sa.String(), nullable=True),
+        sa.Column('response', sa.Text(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'idempotency_key', name='uq_ai_jobs_user_idempotency_key'),
+    )
+    op.create_index(
+        'ix_ai_jobs_queued', 'ai_jobs', ['priority', 'run_at', 'id'],
+        postgresql_where=sa.text("status = 'QUEUED'"), sqlite_where=sa.text("status = 'QUEUED'"),
+    )
+    op.create_index(
+        'ix_ai_jobs_running_lease', 'ai_jobs', ['lease_expires_at'],
+        postgresql_where=sa.text("status = 'RUNNING'"), sqlite_where=sa.text("status = 'RUNNING'"),
+    )
+    op.create_index('ix_ai_jobs_user_status', 'ai_jobs', ['user_id', 'status'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ai_jobs_user_status', table_name='ai_jobs')
+    op.drop_index('ix_ai_jobs_running_lease', table_name='ai_jobs')
+    op.drop_index('ix_ai_jobs_queued', table_name='ai_jobs')
+    op.drop_table('ai_jobs')
+    sa.Enum(name='aijobstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,72 @@
+"""AI interaction history, partitioned by month on PostgreSQL
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def month_bounds(offset: int):
+    today = date.today()
+    index = today.year * 12 + today.month - 1 + offset
+    start = date(index // 12, index % 12 + 1, 1)
+    index += 1
+    return start, date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # The partition key has to be part of the primary key
+        op.execute(
+            """
+            CREATE TABLE ai_interactions (
+                id BIGSERIAL NOT NULL,
+                user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+                source VARCHAR NOT NULL,
+                cache VARCHAR,
+                input_text TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                PRIMARY KEY (id, created_at)
+            ) PARTITION BY RANGE (created_at)
+            """
+        )
+        # The app keeps creating partitions ahead (app.ai_history); these
+        # cover the months until it first runs
+        for offset in range(3):
+            start, end = month_bounds(offset)
+            op.execute(
+                f"CREATE TABLE ai_interactions_p{start.year:04d}_{start.month:02d} PARTITION OF ai_interactions "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+    else:
+        op.create_table(
+            'ai_interactions',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('source', sa.String(), nullable=False),
+            sa.Column('cache', sa.String(), nullable=True),
+            sa.Column('input_text', sa.Text(), nullable=False),
+            sa.Column('response', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    op.create_index('ix_ai_interactions_user_created', 'ai_interactions', ['user_id', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ai_interactions_user_created', table_name='ai_interactions')
+    # Drops the partitions with it
+    op.drop_table('ai_interactions')
@@ -0,0 +1,34 @@
+"""declare products.features as JSON on SQLite
+
+0005 moved the values to JSON text on SQLite but left the column declared
+TEXT, so autogenerate saw the model's JSON type as a change. SQLite can't
+alter a column type in place; batch mode copies the table, indexes and all.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.alter_column('features', type_=sa.JSON(none_as_null=True), existing_type=sa.Text())
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.alter_column('features', type_=sa.Text(), existing_type=sa.JSON(none_as_null=True))
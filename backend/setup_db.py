@@ -10,7 +10,7 @@ from sqlalchemy.orm import Session
 from app.database import engine, SessionLocal
 from app.models import User, Content, Product, UserRole
 from app.auth import get_password_hash
-import json
+from app.facets import category_stats_statements
 
 def create_default_users(db: Session):
     """Create default users for testing"""
@@ -111,7 +111,7 @@ def create_default_products(db: Session):
             "description": "Advanced conversational AI that understands context and provides intelligent responses.",
             "price": 29900,  # $299.00 in cents
             "category": "ai",
-            "features": json.dumps(["Natural Language Processing", "Multi-language Support", "24/7 Availability", "Customizable Responses"]),
+            "features": ["Natural Language Processing", "Multi-language Support", "24/7 Availability", "Customizable Responses"],
             "rating": 48,
             "reviews_count": 124
         },
@@ -120,7 +120,7 @@ def create_default_products(db: Session):
             "description": "Real-time data visualization and predictive analytics for business intelligence.",
             "price": 49900,  # $499.00 in cents
             "category": "ai",
-            "features": json.dumps(["Real-time Data", "Predictive Analytics", "Custom Reports", "API Integration"]),
+            "features": ["Real-time Data", "Predictive Analytics", "Custom Reports", "API Integration"],
             "rating": 49,
             "reviews_count": 89
         },
@@ -129,7 +129,7 @@ def create_default_products(db: Session):
             "description": "Complete online store solution with payment processing and inventory management.",
             "price": 79900,  # $799.00 in cents
             "category": "web",
-            "features": json.dumps(["Payment Processing", "Inventory Management", "Order Tracking", "Mobile Responsive"]),
+            "features": ["Payment Processing", "Inventory Management", "Order Tracking", "Mobile Responsive"],
             "rating": 47,
             "reviews_count": 156
         }
@@ -168,6 +168,9 @@ def main():
         # Create default products
         print("\n🛍️  Creating default products...")
         create_default_products(db)
+        db.flush()
+        for statement in category_stats_statements(engine.dialect.name):
+            db.execute(statement)
         
         # Commit all changes
         db.commit()
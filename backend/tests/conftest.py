@@ -0,0 +1,54 @@
+"""Shared test setup.
+
+Every test run gets a throwaway SQLite database, migrated to head on first
+use, so nothing here can touch a configured development database. Tests
+that need PostgreSQL build their own engine from TEST_POSTGRES_URL and are
+skipped without it.
+"""
+
+import os
+import tempfile
+
+_directory = tempfile.mkdtemp(prefix="dracarys-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["DATABASE_REPLICA_URLS"] = "[]"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["AI_JOB_WORKERS"] = "0"
+os.environ["IMAGE_CACHE_DIR"] = os.path.join(_directory, "media-cache")
+
+import pytest
+from alembic import command
+from alembic.config import Config
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def migrated_db() -> str:
+    """URL of the test database, migrated to head."""
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    command.upgrade(config, "head")
+    return os.environ["DATABASE_URL"]
+
+
+@pytest.fixture(scope="session")
+def client(migrated_db):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="module", params=["sqlite", "postgresql"])
+def database_url(request) -> str:
+    """The test SQLite database, then TEST_POSTGRES_URL (skipped when unset)"""
+    if request.param == "sqlite":
+        return request.getfixturevalue("migrated_db")
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    return url
@@ -0,0 +1,41 @@
+"""Scoping and similarity matching of the AI response cache."""
+
+from app.ai_cache import AIResponseCache
+
+
+def make_cache(threshold: float = 0.8) -> AIResponseCache:
+    return AIResponseCache(max_bytes=1024 * 1024, ttl_seconds=60, similarity_threshold=threshold, dims=512)
+
+
+def test_exact_hit_is_per_scope():
+    cache = make_cache()
+    cache.store("What is Dracarys?", "for alice", scope="alice")
+    assert cache.lookup("what is dracarys", scope="alice") == ("for alice", "exact")
+    assert cache.lookup("what is dracarys", scope="bob") is None
+
+
+def test_own_similar_entry_found_among_many_closer_scopes():
+    cache = make_cache()
+    # Twenty other users hold a prompt closer to the query than alice's own
+    for user in range(20):
+        cache.store("What is the Dracarys pricing plan today", f"for user {user}", scope=str(user))
+    cache.store("What is Dracarys pricing plan", "for alice", scope="alice")
+
+    assert cache.lookup("What is the Dracarys pricing plan?", scope="alice") == ("for alice", "similar")
+    assert cache.stats()["misses"] == 0
+
+
+def test_similar_lookup_never_crosses_scopes():
+    cache = make_cache()
+    cache.store("What is the Dracarys pricing plan today", "for bob", scope="bob")
+    assert cache.lookup("What is the Dracarys pricing plan?", scope="alice") is None
+    assert cache.lookup("What is the Dracarys pricing plan?", scope="bob") == ("for bob", "similar")
+
+
+def test_removed_rows_leave_their_scope():
+    cache = make_cache()
+    cache.store("What is Dracarys pricing plan", "old", scope="alice")
+    cache.store("What is Dracarys pricing plan", "new", scope="bob")
+    cache.store("What is Dracarys pricing plan", "replaced", scope="alice")
+    assert cache.lookup("What is the Dracarys pricing plan?", scope="alice") == ("replaced", "similar")
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,62 @@
+"""The AI interaction buffer and how write errors are classified."""
+
+import asyncio
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError
+
+from app import models
+from app.ai_history import InteractionLog, missing_partition, rejected_rows
+from app.database import get_async_engine
+
+
+class DriverError(Exception):
+    def __init__(self, message: str, sqlstate: str):
+        super().__init__(message)
+        self.sqlstate = sqlstate
+
+
+def test_full_buffer_drops_the_oldest_rows():
+    log = InteractionLog(enabled=True, batch_size=10, flush_interval=1, max_buffer=3)
+    for i in range(5):
+        log.record(1, "process", f"question {i}", "answer")
+    assert [row["input_text"] for row in log._pending] == ["question 2", "question 3", "question 4"]
+    assert (log.stats()["buffered"], log.stats()["dropped"]) == (3, 2)
+
+
+def test_missing_partition_is_read_from_the_sqlstate():
+    # Not the English message: servers with lc_messages set report it translated
+    no_partition = IntegrityError("INSERT", {}, DriverError("keine Partition gefunden", "23514"))
+    foreign_key = IntegrityError("INSERT", {}, DriverError("no partition of relation (in a user name)", "23503"))
+    lost = OperationalError("INSERT", {}, DriverError("connection was closed", "08006"))
+    nul_byte = DBAPIError("INSERT", {}, DriverError("invalid byte sequence", "22021"))
+
+    assert missing_partition(no_partition)
+    assert not missing_partition(foreign_key)
+    assert not missing_partition(lost)
+    assert not missing_partition(RuntimeError("no partition of relation"))
+    assert rejected_rows(foreign_key) and rejected_rows(nul_byte)
+    assert not rejected_rows(lost)
+
+
+def test_flush_writes_the_buffer(migrated_db):
+    log = InteractionLog(enabled=True, batch_size=2, flush_interval=1, max_buffer=10)
+    for i in range(5):
+        log.record(1, "process", f"flush-test {i}", "answer", "miss")
+
+    async def scenario():
+        engine = get_async_engine()
+        try:
+            written = await log.flush()
+            async with engine.begin() as conn:
+                stored = await conn.scalar(
+                    select(func.count()).select_from(models.AIInteraction)
+                    .where(models.AIInteraction.input_text.like("flush-test %"))
+                )
+                await conn.execute(delete(models.AIInteraction).where(models.AIInteraction.input_text.like("flush-test %")))
+            return written, stored
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(scenario()) == (5, 5)
+    assert log.stats() == {"buffered": 0, "written": 5, "batches": 3, "failures": 0, "rejected": 0, "dropped": 0}
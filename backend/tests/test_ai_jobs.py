@@ -0,0 +1,139 @@
+"""Claiming, fencing and reaping on the ai_jobs queue.
+
+Runs on the test SQLite database and, with TEST_POSTGRES_URL, on PostgreSQL,
+where concurrent claims go through FOR UPDATE SKIP LOCKED. Claims commit,
+so the PostgreSQL cases skip unless that database's queue is idle.
+"""
+
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import models
+from app.ai_jobs import AIJobQueue
+from app.database import AsyncSessionLocal, get_async_url
+
+EMAIL = "ai-jobs-test@example.com"
+ACTIVE = (models.AIJobStatus.QUEUED, models.AIJobStatus.RUNNING)
+
+
+@pytest.fixture
+def engine(database_url, monkeypatch):
+    engine = create_async_engine(get_async_url(database_url))
+    # The queue opens its sessions through AsyncSessionLocal
+    monkeypatch.setitem(AsyncSessionLocal.kw, "bind", engine)
+    return engine
+
+
+@pytest.fixture
+def queue():
+    return AIJobQueue(
+        max_attempts=2,
+        retry_backoff=0.01,
+        retry_backoff_max=0.01,
+        lease_seconds=30,
+        poll_interval=0.05,
+        progress_interval=0.05,
+        max_active_per_user=0,
+    )
+
+
+def run_with_user(engine, scenario):
+    """Run ``scenario(user_id)`` with a throwaway user whose jobs are removed afterwards"""
+    async def wrapper():
+        try:
+            async with engine.begin() as conn:
+                if await conn.scalar(select(func.count()).select_from(models.AIJob).where(models.AIJob.status.in_(ACTIVE))):
+                    pytest.skip("the database's AI job queue is not idle")
+                user_id = (await conn.execute(
+                    insert(models.User)
+                    .values(email=EMAIL, name="AI jobs test", hashed_password="x", role=models.UserRole.CLIENT)
+                    .returning(models.User.id)
+                )).scalar_one()
+            try:
+                await scenario(user_id)
+            finally:
+                async with engine.begin() as conn:
+                    await conn.execute(delete(models.AIJob).where(models.AIJob.user_id == user_id))
+                    await conn.execute(delete(models.User).where(models.User.id == user_id))
+        finally:
+            await engine.dispose()
+
+    asyncio.run(wrapper())
+
+
+async def add_job(engine, user_id: int, input_text: str, max_attempts: int = 2) -> int:
+    async with engine.begin() as conn:
+        return (await conn.execute(
+            insert(models.AIJob)
+            .values(user_id=user_id, input_text=input_text, status=models.AIJobStatus.QUEUED,
+                    priority=0, attempts=0, max_attempts=max_attempts, run_at=time.time() - 1)
+            .returning(models.AIJob.id)
+        )).scalar_one()
+
+
+async def load(engine, job_id: int):
+    async with engine.connect() as conn:
+        return (await conn.execute(select(models.AIJob.__table__).where(models.AIJob.id == job_id))).one()
+
+
+async def expire_lease(engine, job_id: int) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(update(models.AIJob).where(models.AIJob.id == job_id).values(lease_expires_at=time.time() - 1))
+
+
+def test_concurrent_claims_take_each_job_once(engine, queue):
+    async def scenario(user_id):
+        job_ids = {await add_job(engine, user_id, f"question {i}") for i in range(3)}
+        claims = await asyncio.gather(*(queue.claim() for _ in range(8)))
+        claimed = [claim for claim in claims if claim is not None]
+        assert sorted(claim.id for claim in claimed) == sorted(job_ids)
+        assert all(claim.attempts == 1 for claim in claimed)
+        assert await queue.claim() is None
+        for job_id in job_ids:
+            assert (await load(engine, job_id)).status == models.AIJobStatus.RUNNING
+
+    run_with_user(engine, scenario)
+
+
+def test_stale_claim_cannot_overwrite_its_replacement(engine, queue):
+    async def scenario(user_id):
+        job_id = await add_job(engine, user_id, "question")
+        stale = await queue.claim()
+
+        # A live lease is left alone
+        assert await queue.reap() == 0
+        await expire_lease(engine, job_id)
+        assert await queue.reap() == 1
+        assert (await load(engine, job_id)).status == models.AIJobStatus.QUEUED
+
+        current = await queue.claim()
+        assert (current.id, current.attempts) == (job_id, stale.attempts + 1)
+        assert not await queue._write(stale, status=models.AIJobStatus.SUCCEEDED, response="stale")
+        await queue._fail(stale, "stale failure", retry=False)
+        assert (await load(engine, job_id)).status == models.AIJobStatus.RUNNING
+
+        assert await queue._write(current, status=models.AIJobStatus.SUCCEEDED, response="current")
+        row = await load(engine, job_id)
+        assert (row.status, row.response, row.error) == (models.AIJobStatus.SUCCEEDED, "current", "Worker stopped responding")
+        assert queue.failed == 0
+
+    run_with_user(engine, scenario)
+
+
+def test_expired_lease_out_of_attempts_fails(engine, queue):
+    async def scenario(user_id):
+        job_id = await add_job(engine, user_id, "question", max_attempts=1)
+        await queue.claim()
+        await expire_lease(engine, job_id)
+        assert await queue.reap() == 1
+        row = await load(engine, job_id)
+        assert (row.status, row.error, row.lease_expires_at) == (models.AIJobStatus.FAILED, "Worker stopped responding", None)
+        assert row.finished_at is not None
+        assert await queue.claim() is None
+        assert queue.reclaimed == 1
+
+    run_with_user(engine, scenario)
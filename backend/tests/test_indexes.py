@@ -0,0 +1,104 @@
+"""The hot queries use the indexes added for them.
+
+Seeds a throwaway dataset inside a transaction that is rolled back, then
+EXPLAINs each query shape issued by app.main / app.auth. Runs against the
+test SQLite database and, when TEST_POSTGRES_URL points at a migrated
+database, against PostgreSQL as well.
+"""
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select, text
+
+from app.filters import json_contains
+from app.models import Content, Product, User
+from app.search import ranked_search_query
+
+SCALE = 20000
+
+
+def seed(conn, scale: int):
+    """Insert enough rows that an index beats a sequential scan"""
+    conn.execute(insert(User), [
+        {"email": f"User-{i}@Example.com", "name": f"User {i}", "hashed_password": "x", "is_active": True}
+        for i in range(scale)
+    ])
+    conn.execute(insert(Content), [
+        {"page": f"page-{i % 200}", "section": f"section-{i}", "title": f"Title {i}",
+         "content": "lorem ipsum " * 20, "order_index": i % 17, "is_active": i % 10 != 0}
+        for i in range(scale)
+    ])
+    conn.execute(insert(Product), [
+        {"name": f"Product {i}", "description": "lorem ipsum " * 20, "price": i * 10,
+         "category": f"cat-{i % 50}", "features": [f"feature-{i % 500}"], "rating": i % 50, "reviews_count": i % 300, "is_active": i % 10 != 0}
+        for i in range(scale)
+    ])
+    for table in ("users", "content", "products"):
+        conn.execute(text(f"ANALYZE {table}"))
+
+
+def hot_queries(dialect: str):
+    """The query shapes issued by app.main / app.auth, paired with the index each should use"""
+    queries = [
+        (
+            "ix_content_page_order_active",
+            select(Content).where(Content.page == "page-7", Content.is_active == True).order_by(Content.order_index),
+        ),
+        (
+            "ix_products_category_active",
+            select(Product).where(Product.is_active == True, Product.category == "cat-3"),
+        ),
+        (
+            "ix_products_created_at_id_active",
+            select(Product).where(Product.is_active == True).order_by(Product.created_at, Product.id).limit(51),
+        ),
+        (
+            "ix_users_email_lower",
+            select(User).where(func.lower(User.email) == "user-42@example.com"),
+        ),
+    ]
+    if dialect == "postgresql":
+        # search_vector and the jsonb GIN index only exist on PostgreSQL
+        queries.append(("ix_products_search_vector_active", ranked_search_query(["1234"], None, 51)))
+        queries.append((
+            "ix_products_features_active",
+            select(Product).where(Product.is_active == True, json_contains(Product.features, ["feature-7"], dialect)),
+        ))
+    return queries
+
+
+def explain(conn, query) -> str:
+    compiled = str(query.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "sqlite":
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).fetchall()
+        return "\n".join(str(row[-1]) for row in rows)
+    rows = conn.execute(text(f"EXPLAIN {compiled}")).fetchall()
+    return "\n".join(row[0] for row in rows)
+
+
+@pytest.fixture(scope="module")
+def seeded(database_url):
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            seed(conn, SCALE)
+            yield conn
+        finally:
+            trans.rollback()
+    engine.dispose()
+
+
+@pytest.mark.parametrize("index_name", [
+    "ix_content_page_order_active",
+    "ix_products_category_active",
+    "ix_products_created_at_id_active",
+    "ix_users_email_lower",
+    "ix_products_search_vector_active",
+    "ix_products_features_active",
+])
+def test_hot_query_uses_index(seeded, index_name):
+    queries = dict(hot_queries(seeded.dialect.name))
+    if index_name not in queries:
+        pytest.skip(f"{index_name} only exists on PostgreSQL")
+    plan = explain(seeded, queries[index_name])
+    assert index_name in plan, f"{index_name} not used:\n{plan}"
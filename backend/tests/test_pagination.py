@@ -0,0 +1,40 @@
+"""Cursor encoding and validation."""
+
+import base64
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.pagination import decode_cursor, encode_cursor
+
+
+def raw_cursor(payload: str) -> str:
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def test_round_trips():
+    assert decode_cursor(encode_cursor(0.25, 7), is_number=True) == (0.25, 7)
+    assert decode_cursor(encode_cursor(3, 7), is_number=True) == (3.0, 7)
+    moment = datetime(2024, 2, 29, 23, 59, 59, 120000)
+    assert decode_cursor(encode_cursor(moment, 7), is_datetime=True) == (moment, 7)
+
+
+@pytest.mark.parametrize("payload", ['["x",1]', "[null,1]", '[{"a":1},2]', "[true,1]", "[NaN,1]", "[Infinity,1]"])
+def test_rank_must_be_a_finite_number(payload):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(raw_cursor(payload), is_number=True)
+    assert raised.value.status_code == 400
+
+
+@pytest.mark.parametrize("payload", ["[1,1]", "[null,1]", '["yesterday",1]'])
+def test_created_at_must_be_a_timestamp(payload):
+    with pytest.raises(HTTPException):
+        decode_cursor(raw_cursor(payload), is_datetime=True)
+
+
+@pytest.mark.parametrize("payload", ['["x",1]', "[null,1]", '[{"a":1},2]', "[NaN,1]"])
+def test_search_rejects_bad_rank_cursor(client, payload):
+    response = client.get("/products/search", params={"q": "bench", "cursor": raw_cursor(payload)})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
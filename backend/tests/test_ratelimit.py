@@ -0,0 +1,109 @@
+"""Token buckets: the Redis Lua script and the in-memory store.
+
+The script runs on fakeredis, and also on a real server when TEST_REDIS_URL
+is set (only keys under a per-run prefix are touched, and they are deleted
+afterwards).
+"""
+
+import asyncio
+import os
+
+import pytest
+
+from app.ratelimit import Limit, MemoryStore, RedisStore
+
+fakeredis = pytest.importorskip("fakeredis")
+
+LIMIT = Limit.parse("5/second")
+PREFIX = "ratelimit-test:"
+
+
+def redis_store(server=None) -> RedisStore:
+    client = fakeredis.FakeAsyncRedis(server=server or fakeredis.FakeServer())
+    return RedisStore("redis://fake", prefix=PREFIX, client=client)
+
+
+@pytest.fixture(params=["fakeredis", "redis", "memory"])
+def store(request):
+    if request.param == "fakeredis":
+        yield redis_store()
+    elif request.param == "redis":
+        url = os.environ.get("TEST_REDIS_URL")
+        if not url:
+            pytest.skip("TEST_REDIS_URL is not set")
+        import redis.asyncio as redis
+        prefix = f"{PREFIX}{os.getpid()}:"
+        yield RedisStore(url, prefix=prefix, client=redis.from_url(url))
+
+        async def cleanup():
+            client = redis.from_url(url)
+            keys = [key async for key in client.scan_iter(match=prefix + "*")]
+            if keys:
+                await client.delete(*keys)
+            await client.aclose()
+        asyncio.run(cleanup())
+    else:
+        yield MemoryStore(shards=2, max_keys=10)
+
+
+def test_burst_then_retry_after(store):
+    async def scenario():
+        burst = [await store.hit("bucket", LIMIT) for _ in range(int(LIMIT.capacity))]
+        rejected = await store.hit("bucket", LIMIT)
+        return burst, rejected
+
+    burst, rejected = asyncio.run(scenario())
+    assert all(decision.allowed for decision in burst)
+    assert burst[-1].remaining < 1
+    assert not rejected.allowed
+    assert 0 < rejected.retry_after <= 1 / LIMIT.refill_per_second
+
+
+def test_zero_cost_hit_peeks(store):
+    async def scenario():
+        for _ in range(int(LIMIT.capacity)):
+            await store.hit("bucket", LIMIT)
+        return await store.hit("bucket", LIMIT, 0)
+
+    peek = asyncio.run(scenario())
+    assert peek.allowed
+    assert peek.remaining < 1
+
+
+def test_refills(store):
+    async def scenario():
+        for _ in range(int(LIMIT.capacity) + 1):
+            await store.hit("bucket", LIMIT)
+        await asyncio.sleep(2 / LIMIT.refill_per_second)
+        return await store.hit("bucket", LIMIT)
+
+    refilled = asyncio.run(scenario())
+    assert refilled.allowed
+    assert 0 <= refilled.remaining < LIMIT.capacity
+
+
+def test_redis_bucket_expires_once_full():
+    server = fakeredis.FakeServer()
+    store = redis_store(server)
+
+    async def scenario():
+        await store.hit("bucket", LIMIT)
+        return await fakeredis.FakeAsyncRedis(server=server).pttl(PREFIX + "bucket")
+
+    ttl = asyncio.run(scenario())
+    assert 0 < ttl <= (LIMIT.capacity / LIMIT.refill_per_second + 1) * 1000
+    assert store.errors == 0
+
+
+def test_redis_connection_error_lets_requests_through():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    store = redis_store(server)
+
+    async def scenario():
+        return [await store.hit("bucket", LIMIT) for _ in range(int(LIMIT.capacity) + 2)]
+
+    decisions = asyncio.run(scenario())
+    assert all(decision.allowed for decision in decisions)
+    assert store.errors == len(decisions)
+    assert store.stats() == {"errors": len(decisions)}
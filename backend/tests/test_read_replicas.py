@@ -0,0 +1,80 @@
+"""Read routing between the primary and a replica.
+
+The primary is the test SQLite database and the replica a copy of it taken
+before the write, so which of the two answered a read shows in whether the
+freshly written product is there.
+"""
+
+import asyncio
+import os
+import shutil
+
+import pytest
+from sqlalchemy import delete, insert, select
+
+from app import database
+from app.database import ReplicaSet, RecentWrites, get_async_engine, read_session
+from app.models import Product
+
+WINDOW = 0.3
+NAME = "replica-routing-check"
+
+
+async def sees_fresh_row(*keys) -> bool:
+    async with read_session(*keys) as db:
+        return (await db.execute(select(Product.id).where(Product.name == NAME))).first() is not None
+
+
+@pytest.fixture
+def replica_dir(migrated_db, tmp_path, monkeypatch):
+    """A replica copied from the primary, registered in a fresh ReplicaSet"""
+    directory = tmp_path / "replica"
+    directory.mkdir()
+    shutil.copy(migrated_db.replace("sqlite:///", "", 1), directory / "replica.db")
+    replicas = ReplicaSet()
+    replicas.build([f"sqlite:///{directory / 'replica.db'}"])
+    monkeypatch.setattr(database, "replicas", replicas)
+    monkeypatch.setattr(database, "recent_writes", RecentWrites(WINDOW))
+    return directory
+
+
+def test_reads_follow_writes_then_the_replica_then_its_health(replica_dir):
+    async def scenario():
+        primary = get_async_engine()
+        replicas, recent_writes = database.replicas, database.recent_writes
+        try:
+            await replicas.start()
+            async with primary.begin() as conn:
+                await conn.execute(insert(Product).values(name=NAME, category=NAME))
+            recent_writes.note("products")
+
+            # Inside the read-your-writes window the writer's keys read the primary
+            assert await sees_fresh_row("products")
+            assert recent_writes.hits == 1
+            # Reads of other keys already go to the replica, which lacks the row
+            assert not await sees_fresh_row("content")
+
+            await asyncio.sleep(WINDOW)
+            assert not await sees_fresh_row("products")
+            assert replicas.members[0].reads == 2
+
+            # A replica that fails its health check is skipped until it passes again
+            replica = replicas.members[0]
+            await replica.engine.dispose()
+            os.rename(replica_dir, f"{replica_dir}-gone")
+            await replicas.check()
+            assert not replica.healthy
+            assert await sees_fresh_row("products")
+            assert replicas.fallbacks == 1
+
+            os.rename(f"{replica_dir}-gone", replica_dir)
+            await replicas.check()
+            assert replica.healthy
+            assert not await sees_fresh_row("products")
+        finally:
+            async with primary.begin() as conn:
+                await conn.execute(delete(Product).where(Product.name == NAME))
+            await replicas.close()
+            await primary.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+"""FAST_JSON_RESPONSES parity.
+
+Seeds awkward rows, renders them through the Pydantic schemas (the default
+path) and through the orjson fast path, and checks the bytes are identical.
+Runs on the test SQLite database and, with TEST_POSTGRES_URL, on PostgreSQL.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app import schemas
+from app.database import get_async_url
+from app.models import Content, Product
+from app.response_cache import render_json
+from app.serialization import CONTENT_FIELDS, IMAGE_FIELDS, PRODUCT_FIELDS, project, render_rows
+
+MARKER = "parity-check"
+
+
+def seed_rows():
+    """Rows covering unicode, escapes, NULLs, JSON shapes and timestamp precision"""
+    on_the_second = datetime(2024, 2, 29, 23, 59, 59, tzinfo=timezone.utc)
+    with_micros = datetime(2024, 3, 1, 8, 0, 0, 120000, tzinfo=timezone.utc)
+    content = [
+        {"page": MARKER, "section": "hero", "title": "Café ☕   \"quoted\" \\ slash", "content": None, "order_index": 0},
+        {"page": MARKER, "section": "body", "title": None, "content": "🐉 " * 50, "image_url": "/a b.png", "order_index": 1,
+         "updated_at": on_the_second},
+    ]
+    products = [
+        {"name": "Ünïcödé 🐉", "description": None, "price": None, "category": MARKER, "features": None},
+        {"name": "List", "description": "tab\there\nnewline", "price": 2**31 - 1, "category": MARKER,
+         "features": ["Real-time Data", "ü", ""], "rating": 49, "reviews_count": 0, "updated_at": with_micros},
+        {"name": "Object", "category": MARKER, "price": 0,
+         "features": {"ports": 2, "ratio": 0.1, "nested": {"ok": True, "none": None}}, "updated_at": on_the_second},
+        {"name": "Legacy", "category": MARKER, "features": "not json"},
+    ]
+    return content, products
+
+
+async def render_both(url, model, schema, fields, where, subset):
+    """(pydantic bytes, orjson bytes) for the seeded rows, seeded and rolled back here"""
+    engine = create_async_engine(get_async_url(url))
+    try:
+        async with engine.connect() as conn:
+            trans = await conn.begin()
+            try:
+                content, products = seed_rows()
+                for row in content:
+                    await conn.execute(insert(Content).values(**row))
+                for row in products:
+                    await conn.execute(insert(Product).values(**row))
+                session = AsyncSession(bind=conn)
+                entities = (await session.execute(select(model).where(where).order_by(model.id))).scalars().all()
+                expected = render_json([
+                    schema.model_validate(entity).model_dump(mode="json", include=set(subset) if subset else None)
+                    for entity in entities
+                ])
+                output = subset or fields
+                rows = (await conn.execute(select(*project(model, output)).where(where).order_by(model.id))).all()
+                actual = render_rows(rows, output, () if subset else IMAGE_FIELDS)
+                return expected, actual
+            finally:
+                await trans.rollback()
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.parametrize("model, schema, fields, where, subset", [
+    pytest.param(Content, schemas.Content, CONTENT_FIELDS, Content.page == MARKER, None, id="content"),
+    pytest.param(Product, schemas.Product, PRODUCT_FIELDS, Product.category == MARKER, None, id="products"),
+    pytest.param(Product, schemas.Product, PRODUCT_FIELDS, Product.category == MARKER,
+                 ("name", "features", "updated_at"), id="products-fields"),
+])
+def test_fast_path_matches_pydantic(database_url, model, schema, fields, where, subset):
+    expected, actual = asyncio.run(render_both(database_url, model, schema, fields, where, subset))
+    assert actual == expected
@@ -0,0 +1,80 @@
+"""Collapsing concurrent identical calls."""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.singleflight import SingleFlight
+
+
+def test_cancelled_leader_leaves_followers_the_result():
+    async def scenario():
+        flight = SingleFlight(timeout=5)
+        release = asyncio.Event()
+        loads = []
+
+        async def loader():
+            loads.append(1)
+            await release.wait()
+            return "rows"
+
+        leader = asyncio.ensure_future(flight.do("key", loader))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flight.do("key", loader)) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        # The client behind the first request goes away mid-load
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert flight.stats()["in_flight"] == 1
+        late = asyncio.ensure_future(flight.do("key", loader))
+        await asyncio.sleep(0)
+
+        release.set()
+        assert await asyncio.gather(*followers, late) == ["rows"] * 4
+        assert loads == [1]
+        assert flight.stats() == {"in_flight": 0, "leaders": 1, "followers": 4, "timeouts": 0}
+
+    asyncio.run(scenario())
+
+
+def test_error_reaches_every_caller_and_the_next_call_retries():
+    async def scenario():
+        flight = SingleFlight(timeout=5)
+        attempts = []
+
+        async def loader():
+            attempts.append(1)
+            await asyncio.sleep(0.01)
+            if len(attempts) == 1:
+                raise RuntimeError("database went away")
+            return "rows"
+
+        results = await asyncio.gather(*(flight.do("key", loader) for _ in range(3)), return_exceptions=True)
+        assert [type(result) for result in results] == [RuntimeError] * 3
+        assert await flight.do("key", loader) == "rows"
+        assert len(attempts) == 2
+
+    asyncio.run(scenario())
+
+
+def test_timeout_is_a_504_and_the_load_carries_on():
+    async def scenario():
+        flight = SingleFlight(timeout=0.01, detail="Timed out")
+
+        async def loader():
+            await asyncio.sleep(0.05)
+            return "rows"
+
+        with pytest.raises(HTTPException) as raised:
+            await flight.do("key", loader)
+        assert (raised.value.status_code, raised.value.detail) == (504, "Timed out")
+        assert flight.stats()["in_flight"] == 1
+
+        flight.timeout = 1
+        assert await flight.do("key", loader) == "rows"
+        assert flight.stats() == {"in_flight": 0, "leaders": 1, "followers": 1, "timeouts": 1}
+
+    asyncio.run(scenario())
@@ -41,4 +41,18 @@ export async function apiCall(endpoint: string, options: RequestInit = {}) {
     console.error('API call failed:', error)
     throw error
   }
-} 
\ No newline at end of file
+} 
+
+export interface PageBundle {
+  page: string
+  content: Array<Record<string, any>> | null
+  products: Array<Record<string, any>> | null
+  user: Record<string, any> | null
+}
+
+// One request per navigation: the page's content, its product slice (if the
+// backend's PAGE_BUNDLES gives it one) and the signed-in user
+export async function fetchPageBundle(page: string, options: { category?: string } = {}): Promise<PageBundle> {
+  const query = options.category ? `?category=${encodeURIComponent(options.category)}` : ''
+  return apiCall(`/pages/${encodeURIComponent(page)}/bundle${query}`)
+}